@@ -0,0 +1,149 @@
+import os
+import json
+
+from argparse import ArgumentParser
+from configparser import ConfigParser
+from urllib.parse import urlparse
+
+import numpy as np
+
+from utils import get_logger
+from utils.config import Config
+from utils.export import GROUPS
+
+
+# Computes the crawl report from a columnar export (see utils/export.py and
+# [EXPORT] in config.ini) instead of from the log files: the unique pages, the
+# longest page, the pages per ics subdomain, the most common words, the most
+# linked urls, and the PageRank of the crawled pages over the links between
+# them. All of it is computed over whole columns with numpy.
+
+ICS_DOMAIN = "ics.uci.edu"
+
+
+def load_export(directory):
+    # Returns (columns by name, urls by id, words by id).
+    with open(os.path.join(directory, "meta.json")) as file:
+        meta = json.load(file)
+    order = "<" if meta["byteorder"] == "little" else ">"
+    columns = {
+        name: np.fromfile(
+            os.path.join(directory, name),
+            dtype=np.dtype(dtype).newbyteorder(order))
+        for name, dtype in meta["columns"].items()}
+    for group in GROUPS:
+        # Cut to the same length, like CrawlExporter does on opening, in case
+        # the crawl is still writing.
+        length = min(len(columns[name]) for name in group)
+        for name in group:
+            columns[name] = columns[name][:length]
+    lines = dict()
+    for name in ("urls.txt", "words.txt"):
+        with open(os.path.join(directory, name), encoding="utf-8") as file:
+            lines[name] = file.read().split("\n")[:-1]
+    return columns, lines["urls.txt"], lines["words.txt"]
+
+
+def subdomain_counts(urls, page_urls):
+    # Returns (subdomains, pages per subdomain) of the ics subdomains.
+    page_ids = np.unique(page_urls)
+    hosts = np.array([urlparse(urls[url_id]).hostname or "" for url_id in page_ids])
+    subdomains, host_ids = np.unique(hosts, return_inverse=True)
+    counts = np.bincount(host_ids, minlength=len(subdomains))
+    ics = np.char.find(subdomains.astype(str), ICS_DOMAIN) >= 0
+    return subdomains[ics], counts[ics]
+
+
+def top_words(token_words, token_counts, word_count, k):
+    # Returns (word ids, counts) of the k most common words.
+    totals = np.bincount(token_words, weights=token_counts, minlength=word_count)
+    return _top(totals, k)
+
+
+def _top(values, k):
+    # Indices and values of the k largest [values], largest first.
+    k = min(k, len(values))
+    if k == 0:
+        return np.array([], dtype=np.int64), values[:0]
+    top = np.argpartition(-values, k - 1)[:k]
+    top = top[np.argsort(-values[top], kind="stable")]
+    return top, values[top]
+
+
+def pagerank(sources, targets, pages, url_count, damping=0.85,
+             iterations=100, tolerance=1e-10):
+    # Returns (url ids of the pages, their PageRank, iterations run) over the
+    # links between crawled [pages]. Links to urls that were not crawled are
+    # dropped, and pages without links spread their rank over all pages.
+    nodes = np.unique(pages)
+    n = len(nodes)
+    if n == 0:
+        return nodes, np.zeros(0), 0
+    index = np.full(url_count, -1, dtype=np.int64)
+    index[nodes] = np.arange(n)
+    src, dst = index[sources], index[targets]
+    keep = (src >= 0) & (dst >= 0) & (src != dst)
+    # A link counts once per pair of pages.
+    edges = np.unique(src[keep] * n + dst[keep])
+    src, dst = edges // n, edges % n
+    out_degree = np.bincount(src, minlength=n)
+    dangling = out_degree == 0
+    rank = np.full(n, 1.0 / n)
+    for iteration in range(1, iterations + 1):
+        spread = np.bincount(
+            dst, weights=rank[src] / out_degree[src], minlength=n)
+        new_rank = (1 - damping) / n + damping * (spread + rank[dangling].sum() / n)
+        delta = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if delta < tolerance:
+            break
+    return nodes, rank, iteration
+
+
+def main(config_file, directory, top):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    directory = directory or config.export_dir
+    if not directory:
+        raise ValueError("No export, set [EXPORT] DIRECTORY or --export.")
+    logger = get_logger("ANALYSIS")
+    columns, urls, words = load_export(directory)
+    page_urls = columns["pages.url"]
+    page_words = columns["pages.words"]
+
+    logger.info(f"{len(np.unique(page_urls))} unique pages, {len(urls)} urls "
+                f"and {len(columns['edges.src'])} links.")
+    if len(page_urls):
+        longest = int(np.argmax(page_words))
+        logger.info(f"{urls[page_urls[longest]]} is the longest page with "
+                    f"{page_words[longest]} words.")
+
+    subdomains, counts = subdomain_counts(urls, page_urls)
+    logger.info(f"Found {len(subdomains)} ics subdomains.")
+    for subdomain, count in zip(subdomains, counts):
+        logger.info(f"{subdomain}:{count}")
+
+    word_ids, counts = top_words(
+        columns["tokens.word"], columns["tokens.count"], len(words), top)
+    for word_id, count in zip(word_ids, counts):
+        logger.info(f"{words[word_id]}:{int(count)}")
+
+    in_degree = np.bincount(columns["edges.dst"], minlength=len(urls))
+    for url_id, count in zip(*_top(in_degree, top)):
+        logger.info(f"{urls[url_id]} is linked {count} times.")
+
+    nodes, rank, iterations = pagerank(
+        columns["edges.src"], columns["edges.dst"], page_urls, len(urls))
+    logger.info(f"PageRank of {len(nodes)} pages after {iterations} iterations.")
+    for node, value in zip(*_top(rank, top)):
+        logger.info(f"{urls[nodes[node]]}: {value:.6f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--export", type=str, default=None)
+    parser.add_argument("--top", type=int, default=50)
+    args = parser.parse_args()
+    main(args.config_file, args.export, args.top)
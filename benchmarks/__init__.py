@@ -0,0 +1,14 @@
+from configparser import ConfigParser
+
+from utils.config import Config
+
+
+# Builds a Config from [config_file] as launch.py does, then overrides
+# attributes, e.g. load_config(save_file="bench.save", store="sqlite").
+def load_config(config_file="config.ini", **overrides):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    return config
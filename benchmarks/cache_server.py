@@ -0,0 +1,208 @@
+import time
+import pickle
+import random
+import cbor
+import requests
+
+from argparse import ArgumentParser
+from hashlib import blake2b
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+from urllib.parse import urlparse, parse_qs
+
+from utils.response_store import ResponseStore
+
+
+# Local stand-in for the spacetime cache server.
+#
+# Answers GET /?q=<url>&u=<useragent> like the real cache does: a CBOR map with
+# the url, the status and the pickled requests.Response of the page. Pages
+# come from a deterministic synthetic website so runs are repeatable, or with
+# --recorded from a stored crawl. Point the crawler at it with
+# CACHESERVER = localhost:<port> in config.ini.
+#
+# Run from the project root:
+#     python -m benchmarks.cache_server --port 9001 --latency 0.05
+
+
+def _make_words(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz")
+                for _ in range(3 + i % 7))
+        for i in range(count)]
+
+
+WORDS = _make_words(5000)
+
+
+class SyntheticSite(object):
+    # Every host has pages_per_host pages under /page/<n> linking to random
+    # pages of all hosts. Optionally, a trap_rate share of pages also link to
+    # an endless calendar under /calendar/<day>, a duplicate_rate share have
+    # the same content as /page/0 of their host, and a large_rate share have
+    # large_factor times as many words.
+    def __init__(self, hosts=("www.ics.uci.edu", "www.cs.uci.edu",
+                              "www.informatics.uci.edu", "www.stat.uci.edu"),
+                 pages_per_host=1000, links_per_page=20, words_per_page=300,
+                 trap_rate=0.0, duplicate_rate=0.0, large_rate=0.0,
+                 large_factor=50):
+        self.hosts = list(hosts)
+        self.pages_per_host = pages_per_host
+        self.links_per_page = links_per_page
+        self.words_per_page = words_per_page
+        self.trap_rate = trap_rate
+        self.duplicate_rate = duplicate_rate
+        self.large_rate = large_rate
+        self.large_factor = large_factor
+
+    def seed_urls(self):
+        return [f"https://{host}" for host in self.hosts]
+
+    def _random(self, url):
+        return random.Random(blake2b(url.encode("utf-8")).digest())
+
+    def _page_url(self, rng):
+        host = rng.choice(self.hosts)
+        return f"https://{host}/page/{rng.randrange(self.pages_per_host)}"
+
+    # Returns (status, html bytes) of [url].
+    def page(self, url):
+        parsed = urlparse(url)
+        if parsed.hostname not in self.hosts:
+            return 404, b""
+        if parsed.path.startswith("/calendar/"):
+            return 200, self._calendar_page(parsed)
+        rng = self._random(url)
+        if rng.random() < self.duplicate_rate:
+            url = f"https://{parsed.hostname}/page/0"
+            rng = self._random(url)
+            rng.random()
+        word_count = self.words_per_page
+        if rng.random() < self.large_rate:
+            word_count *= self.large_factor
+        words = " ".join(rng.choice(WORDS) for _ in range(word_count))
+        links = "".join(
+            f'<a href="{self._page_url(rng)}">link</a>\n'
+            for _ in range(self.links_per_page))
+        if rng.random() < self.trap_rate:
+            links += (
+                f'<a href="https://{parsed.hostname}/calendar/'
+                f'{rng.randrange(1000000)}">calendar</a>\n')
+        html = (
+            f"<html><head><title>{url}</title></head>"
+            f"<body><p>{words}</p>\n{links}</body></html>")
+        return 200, html.encode("utf-8")
+
+    def _calendar_page(self, parsed):
+        # Links to the previous and the next day, forever.
+        day = int(parsed.path.rsplit("/", 1)[1] or 0)
+        rng = self._random(f"{parsed.hostname}/calendar")
+        words = " ".join(rng.choice(WORDS) for _ in range(150))
+        html = (
+            f"<html><head><title>Day {day}</title></head>"
+            f"<body><h1>Day {day}</h1><p>{words}</p>\n"
+            f'<a href="/calendar/{day - 1}">previous</a>\n'
+            f'<a href="/calendar/{day + 1}">next</a>\n</body></html>')
+        return html.encode("utf-8")
+
+
+class RecordedSite(object):
+    # Serves the pages of a crawl stored in a utils.response_store directory,
+    # see [RESPONSECACHE] in config.ini. Urls that were not stored are 404.
+    def __init__(self, directory):
+        self.store = ResponseStore(directory)
+
+    def seed_urls(self):
+        # The first stored url of every host.
+        seeds = dict()
+        for url, _ in self.store.responses():
+            seeds.setdefault(urlparse(url).hostname, url)
+        return list(seeds.values())
+
+    # Returns (status, html bytes) of [url].
+    def page(self, url):
+        resp = self.store.get(url)
+        if resp is None or resp.raw_response is None:
+            return 404, b""
+        return resp.status, resp.raw_response.content
+
+
+def encode_response(url, status, content):
+    # Pickled the same way the real cache server ships pages.
+    raw_response = requests.Response()
+    raw_response.status_code = status
+    raw_response._content = content
+    raw_response.url = url
+    raw_response.encoding = "utf-8"
+    raw_response.headers["Content-Type"] = "text/html"
+    return cbor.dumps({
+        "url": url, "status": status, "response": pickle.dumps(raw_response)})
+
+
+def make_handler(site, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Keep-alive.
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            if "q" not in query:
+                self.send_error(400)
+                return
+            url = query["q"][0]
+            if latency:
+                time.sleep(latency)
+            status, content = site.page(url)
+            body = encode_response(url, status, content)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/cbor")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+# Starts the stand-in in a background thread. Port 0 picks a free port, the
+# actual one is server.server_address[1]. Stop it with server.shutdown().
+def start_server(site, port=0, latency=0.0):
+    server = ThreadingHTTPServer(("localhost", port), make_handler(site, latency))
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(args):
+    if args.recorded:
+        site = RecordedSite(args.recorded)
+        pages = len(site.store)
+    else:
+        site = SyntheticSite(
+            pages_per_host=args.pages, links_per_page=args.links,
+            words_per_page=args.words, trap_rate=args.trap_rate,
+            duplicate_rate=args.duplicate_rate, large_rate=args.large_rate)
+        pages = len(site.hosts) * args.pages
+    server = ThreadingHTTPServer(
+        ("localhost", args.port), make_handler(site, args.latency))
+    print(f"Serving {pages} pages on "
+          f"localhost:{server.server_address[1]}, seeds: "
+          f"{','.join(site.seed_urls())}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--links", type=int, default=20)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--trap_rate", type=float, default=0.0)
+    parser.add_argument("--duplicate_rate", type=float, default=0.0)
+    parser.add_argument("--large_rate", type=float, default=0.0)
+    parser.add_argument("--recorded", type=str, default=None)
+    main(parser.parse_args())
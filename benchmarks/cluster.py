@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+import socket
+import shutil
+import tempfile
+import subprocess
+
+from argparse import ArgumentParser
+from configparser import ConfigParser
+
+from benchmarks import load_config
+from benchmarks.cache_server import SyntheticSite, start_server
+from crawler.cluster import partition_of
+from crawler.store import open_store
+
+
+# Runs a distributed crawl on this machine and checks it.
+#
+# Starts the stand-in cache server, then crawls its synthetic site once with
+# one launch.py process and once with --nodes processes, each in its own
+# directory under --dir so logs and save files stay apart. Checks that every
+# node only crawled urls of its own partition, that no url was crawled twice,
+# that the nodes together crawled the same urls as the single process, and
+# that node 0 reported as many downloads for the cluster as the single
+# process did, then prints the time of both.
+#
+# The stand-in runs in this process for all nodes, so keep --latency well
+# above the time it needs per page, or it becomes the bottleneck.
+#
+# Run from the project root:
+#     python -m benchmarks.cluster [--nodes 3] [--hosts 12] [--pages 100]
+
+LAUNCH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "launch.py")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def write_config(path, args, site, cache_port, nodes, node_id):
+    cparser = ConfigParser()
+    cparser.read("config.ini")
+    cparser["CONNECTION"]["CACHESERVER"] = f"localhost:{cache_port}"
+    cparser["CRAWLER"]["SEEDURL"] = ",".join(site.seed_urls())
+    cparser["CRAWLER"]["POLITENESS"] = str(args.politeness)
+    cparser["LOCAL PROPERTIES"]["SAVE"] = "frontier.shelve"
+    cparser["LOCAL PROPERTIES"]["THREADCOUNT"] = str(args.threads)
+    cparser["LOCAL PROPERTIES"]["STORE"] = args.store
+    if not cparser.has_section("CLUSTER"):
+        cparser.add_section("CLUSTER")
+    cparser["CLUSTER"]["NODES"] = ",".join(f"localhost:{port}" for port in nodes)
+    cparser["CLUSTER"]["NODEID"] = str(node_id)
+    if not cparser.has_section("STATS"):
+        cparser.add_section("STATS")
+    cparser["STATS"]["SNAPSHOTINTERVAL"] = "0"
+    with open(path, "w") as file:
+        cparser.write(file)
+
+
+def crawled_urls(directory, save_file):
+    # Returns the urls marked complete in a node's save file.
+    config = load_config(
+        os.path.join(directory, "config.ini"),
+        save_file=os.path.join(directory, save_file))
+    store = open_store(config)
+    try:
+        return [url for url, completed in store.values() if completed]
+    finally:
+        store.close()
+
+
+def reported_downloads(directory):
+    # Returns the number of unique downloads in a node's results.
+    with open(os.path.join(directory, "Logs", "results.log")) as file:
+        for line in file:
+            if line.rstrip().endswith(" unique downloads"):
+                return int(line.rsplit(" - ", 1)[1].split()[0])
+    return None
+
+
+def crawl(args, site, cache_port, node_count):
+    # Returns (seconds, list of the urls crawled by each node, downloads
+    # reported by node 0).
+    root = tempfile.mkdtemp(prefix=f"cluster{node_count}-", dir=args.dir)
+    nodes = [free_port() for _ in range(node_count)] if node_count > 1 else []
+    processes = list()
+    for node_id in range(node_count):
+        directory = os.path.join(root, f"node{node_id}")
+        os.makedirs(directory)
+        write_config(
+            os.path.join(directory, "config.ini"), args, site, cache_port,
+            nodes, node_id)
+    start = time.perf_counter()
+    for node_id in range(node_count):
+        processes.append(subprocess.Popen(
+            [sys.executable, LAUNCH, "--restart", "--config_file", "config.ini"],
+            cwd=os.path.join(root, f"node{node_id}"),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    for process in processes:
+        if process.wait() != 0:
+            print(f"A node exited with status {process.returncode}, see {root}.")
+            sys.exit(1)
+    elapsed = time.perf_counter() - start
+    save_file = "frontier.shelve.node{}" if nodes else "frontier.shelve"
+    crawled = [
+        crawled_urls(os.path.join(root, f"node{node_id}"), save_file.format(node_id))
+        for node_id in range(node_count)]
+    downloads = reported_downloads(os.path.join(root, "node0"))
+    if not args.keep:
+        shutil.rmtree(root)
+    return elapsed, crawled, downloads
+
+
+def main(args):
+    site = SyntheticSite(
+        hosts=[f"host{i}.ics.uci.edu" for i in range(args.hosts)],
+        pages_per_host=args.pages)
+    server = start_server(site, latency=args.latency)
+    cache_port = server.server_address[1]
+    try:
+        single_time, (single,), single_downloads = crawl(
+            args, site, cache_port, 1)
+        cluster_time, crawled, downloads = crawl(
+            args, site, cache_port, args.nodes)
+    finally:
+        server.shutdown()
+
+    all_urls = [url for urls in crawled for url in urls]
+    for node_id, urls in enumerate(crawled):
+        foreign = [url for url in urls if partition_of(url, args.nodes) != node_id]
+        if foreign:
+            print(f"Node {node_id} crawled {len(foreign)} urls of other "
+                  f"partitions, e.g. {foreign[0]}.")
+            sys.exit(1)
+    if len(all_urls) != len(set(all_urls)):
+        print(f"{len(all_urls) - len(set(all_urls))} urls were crawled twice.")
+        sys.exit(1)
+    if set(all_urls) != set(single):
+        print(f"The nodes crawled {len(set(all_urls))} urls, one process "
+              f"{len(set(single))}.")
+        sys.exit(1)
+    if downloads != single_downloads:
+        print(f"Node 0 reported {downloads} downloads, one process "
+              f"{single_downloads}.")
+        sys.exit(1)
+    print(f"Urls crawled per node: {', '.join(str(len(urls)) for urls in crawled)}.")
+    print(f"{'1 node':>8}: {len(single):7} urls in {single_time:7.2f}s")
+    print(f"{f'{args.nodes} nodes':>8}: {len(all_urls):7} urls in {cluster_time:7.2f}s")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--hosts", type=int, default=12)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--store", type=str, default="sqlite")
+    parser.add_argument("--politeness", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--dir", type=str, default=None)
+    parser.add_argument("--keep", action="store_true", default=False)
+    main(parser.parse_args())
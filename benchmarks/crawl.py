@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import tempfile
+import subprocess
+
+from argparse import ArgumentParser
+from functools import wraps
+
+from benchmarks.cache_server import SyntheticSite, RecordedSite, start_server
+
+
+# Benchmark of the whole crawl pipeline against the local stand-in cache
+# server: Worker.run -> download -> scraper -> Frontier.add_url.
+#
+# Serves a synthetic site with crawler traps, duplicate pages and large pages,
+# or with --recorded a crawl kept in a response store, then crawls it once for
+# every combination of --threads and --stores. Every crawl runs in its own
+# process and directory, so peak RSS and the scraper's module state are its
+# own. Prints the urls crawled per second, the peak RSS and the 50th, 90th and
+# 99th percentile latency in milliseconds of every stage:
+#
+#     get       Frontier.get_tbd_url, including politeness waits
+#     download  utils.download.download
+#     parse     scraper.parse_page, extraction and tokenizing
+#     merge     scraper.merge_page, dedup and stats
+#     filter    scraper.filter_links, validity, seen urls and trap budgets
+#     add_url   Frontier.add_url
+#     complete  Frontier.mark_url_complete
+#
+# Run from the project root:
+#     python -m benchmarks.crawl [--threads 1 4 8] [--stores shelve sqlite]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ["get", "download", "parse", "merge", "filter", "add_url", "complete"]
+
+
+def percentile(samples, fraction):
+    # [samples] must be sorted.
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def timed(function, samples):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+    return wrapper
+
+
+def run_child(args):
+    # Runs one crawl in this process and writes its results to args.result.
+    # The crawler's modules are imported here, after the working directory
+    # was set, since their loggers open files under Logs/ on import.
+    import scraper
+    import crawler.worker
+    from benchmarks import load_config
+    from crawler import Crawler
+    from crawler.frontier import Frontier
+    from crawler.store import open_store
+
+    samples = {stage: list() for stage in STAGES}
+    crawler.worker.download = timed(crawler.worker.download, samples["download"])
+    scraper.parse_page = timed(scraper.parse_page, samples["parse"])
+    scraper.merge_page = timed(scraper.merge_page, samples["merge"])
+    scraper.filter_links = timed(scraper.filter_links, samples["filter"])
+    Frontier.get_tbd_url = timed(Frontier.get_tbd_url, samples["get"])
+    Frontier.add_url = timed(Frontier.add_url, samples["add_url"])
+    Frontier.mark_url_complete = timed(
+        Frontier.mark_url_complete, samples["complete"])
+
+    config = load_config(
+        os.path.join(ROOT, "config.ini"), save_file="frontier.save",
+        store=args.store, threads_count=args.threads,
+        cache_server=("localhost", args.port), seed_urls=args.seeds,
+        time_delay=args.politeness, snapshot_interval=0, response_cache=None,
+        incremental=False, async_download=False)
+    start = time.perf_counter()
+    Crawler(config, True).start()
+    elapsed = time.perf_counter() - start
+
+    store = open_store(config)
+    try:
+        urls = sum(1 for _, completed in store.values() if completed)
+    finally:
+        store.close()
+    stages = dict()
+    for stage, stage_samples in samples.items():
+        stage_samples.sort()
+        stages[stage] = [
+            percentile(stage_samples, fraction) * 1000
+            for fraction in (0.5, 0.9, 0.99)]
+    with open(args.result, "w") as file:
+        json.dump({
+            "urls": urls, "seconds": elapsed,
+            "unique_downloads": len(scraper.site_hashes),
+            # Kilobytes on Linux.
+            "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "stages": stages}, file)
+
+
+def crawl(args, seeds, port, threads, store):
+    # Returns the results of one crawl in a new process, or None if it failed.
+    directory = tempfile.mkdtemp(prefix=f"crawl-{store}-{threads}-", dir=args.dir)
+    result = os.path.join(directory, "result.json")
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        path for path in (ROOT, env.get("PYTHONPATH")) if path)
+    process = subprocess.run(
+        [sys.executable, "-m", "benchmarks.crawl", "--child",
+         "--port", str(port), "--threads", str(threads), "--stores", store,
+         "--politeness", str(args.politeness), "--result", result,
+         "--seeds", *seeds],
+        cwd=directory, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if process.returncode != 0:
+        print(f"The crawl exited with status {process.returncode}, see {directory}.")
+        return None
+    with open(result) as file:
+        results = json.load(file)
+    if not args.keep:
+        shutil.rmtree(directory)
+    return results
+
+
+def main(args):
+    if args.recorded:
+        site = RecordedSite(args.recorded)
+    else:
+        site = SyntheticSite(
+            hosts=[f"host{i}.ics.uci.edu" for i in range(args.hosts)],
+            pages_per_host=args.pages, words_per_page=args.words,
+            trap_rate=args.trap_rate, duplicate_rate=args.duplicate_rate,
+            large_rate=args.large_rate)
+    server = start_server(site, latency=args.latency)
+    seeds = site.seed_urls()
+    try:
+        print(f"{'store':>8} {'threads':>7} {'urls':>7} {'urls/sec':>9} "
+              f"{'unique':>7} {'RSS MB':>7}  " +
+              " ".join(f"{stage:>20}" for stage in STAGES))
+        print(f"{'':50}  " + " ".join(
+            f"{'p50/p90/p99 ms':>20}" for _ in STAGES))
+        for store in args.stores:
+            for threads in args.threads:
+                results = crawl(args, seeds, server.server_address[1], threads, store)
+                if results is None:
+                    continue
+                print(
+                    f"{store:>8} {threads:>7} {results['urls']:>7} "
+                    f"{results['urls'] / results['seconds']:>9.1f} "
+                    f"{results['unique_downloads']:>7} "
+                    f"{results['peak_rss'] / 1024:>7.1f}  " +
+                    " ".join(
+                        f"{'/'.join(f'{ms:.1f}' for ms in results['stages'][stage]):>20}"
+                        for stage in STAGES),
+                    flush=True)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--stores", type=str, nargs="+", default=["shelve", "sqlite"])
+    parser.add_argument("--hosts", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--trap_rate", type=float, default=0.05)
+    parser.add_argument("--duplicate_rate", type=float, default=0.05)
+    parser.add_argument("--large_rate", type=float, default=0.01)
+    parser.add_argument("--recorded", type=str, default=None)
+    parser.add_argument("--politeness", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--dir", type=str, default=None)
+    parser.add_argument("--keep", action="store_true", default=False)
+    # Used by the crawl processes.
+    parser.add_argument("--child", action="store_true", default=False)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--seeds", type=str, nargs="+", default=None)
+    parser.add_argument("--result", type=str, default=None)
+    args = parser.parse_args()
+    if args.child:
+        args.threads, = args.threads
+        args.store, = args.stores
+        run_child(args)
+    else:
+        main(args)
@@ -0,0 +1,74 @@
+import time
+import tracemalloc
+
+from argparse import ArgumentParser
+from hashlib import sha256
+
+from utils.dedup import DigestSet, BloomFilter, digest_size_for
+
+
+# Compares memory use and lookup rate of the dedup sets in utils/dedup.py
+# with the plain python sets they replace, and measures the observed false
+# positive rate against the configured budget.
+#
+# Run from the project root:
+#     python -m benchmarks.dedup --urls 200000 --fp_rate 1e-6
+
+
+def iter_urls(count, offset=0):
+    for i in range(count):
+        yield f"https://www.ics.uci.edu/~user{i % 977}/pages/{i + offset}.html"
+
+
+def measure(name, factory, urls, misses):
+    # Urls are created inside the traced region so a set that keeps them
+    # alive is charged for them.
+    tracemalloc.start()
+    dedup = factory()
+    for url in iter_urls(len(urls)):
+        dedup.add(url)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for url in urls:
+        url in dedup
+    hit_rate = len(urls) / (time.perf_counter() - start)
+
+    false_positives = sum(1 for url in misses if url in dedup)
+    print(
+        f"{name:>22}: {memory / len(urls):8.1f} bytes/url "
+        f"{hit_rate:12.0f} lookups/sec "
+        f"{false_positives / len(misses):.2e} false positives")
+
+
+def main(args):
+    urls = list(iter_urls(args.urls))
+    misses = list(iter_urls(args.urls, offset=args.urls))
+    digest_size = digest_size_for(args.urls, args.fp_rate)
+
+    measure("set of urls", set, urls, misses)
+    measure("set of sha256 hex", HexSet, urls, misses)
+    measure(
+        f"DigestSet ({digest_size} bytes)",
+        lambda: DigestSet(args.urls, digest_size), urls, misses)
+    measure(
+        f"BloomFilter ({args.bloom_fp_rate})",
+        lambda: BloomFilter(args.urls, args.bloom_fp_rate), urls, misses)
+
+
+class HexSet(set):
+    # The urlhash keys the frontier used to keep in memory.
+    def add(self, url):
+        super().add(sha256(url.encode("utf-8")).hexdigest())
+
+    def __contains__(self, url):
+        return super().__contains__(sha256(url.encode("utf-8")).hexdigest())
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=200000)
+    parser.add_argument("--fp_rate", type=float, default=1e-6)
+    parser.add_argument("--bloom_fp_rate", type=float, default=0.01)
+    main(parser.parse_args())
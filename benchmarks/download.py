@@ -0,0 +1,62 @@
+import time
+import asyncio
+
+from argparse import ArgumentParser
+
+from benchmarks import load_config
+from benchmarks.cache_server import SyntheticSite, start_server
+from utils import get_logger
+from utils.download import download
+from utils.async_download import CacheClient
+
+
+# Compares utils.download.download, one blocking request at a time, with the
+# pooled CacheClient keeping --inflight requests in flight, against a local
+# stand-in cache server that takes --latency seconds per request.
+#
+# Run from the project root:
+#     python -m benchmarks.download --urls 200 --latency 0.05 --inflight 16
+
+
+def run_sync(config, urls, logger):
+    start = time.perf_counter()
+    for url in urls:
+        assert download(url, config, logger).status == 200
+    return len(urls) / (time.perf_counter() - start)
+
+
+def run_async(config, urls, logger):
+    async def fetch_all():
+        client = CacheClient(config, logger)
+        try:
+            return await asyncio.gather(*(client.download(url) for url in urls))
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    for resp in asyncio.run(fetch_all()):
+        assert resp.status == 200
+    return len(urls) / (time.perf_counter() - start)
+
+
+def main(args):
+    site = SyntheticSite()
+    server = start_server(site, latency=args.latency)
+    config = load_config(
+        cache_server=server.server_address[:2], max_inflight=args.inflight)
+    logger = get_logger("BENCHMARK")
+    urls = [f"https://www.ics.uci.edu/page/{i}" for i in range(args.urls)]
+    try:
+        print(f"   sync: {run_sync(config, urls, logger):10.1f} urls/sec")
+        print(f"  async: {run_async(config, urls, logger):10.1f} urls/sec "
+              f"({args.inflight} in flight)")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--inflight", type=int, default=16)
+    main(parser.parse_args())
@@ -0,0 +1,115 @@
+import sys
+import time
+import random
+
+from argparse import ArgumentParser
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+import tokenizer
+from benchmarks.cache_server import SyntheticSite, WORDS
+from utils import canonicalize
+from utils.extract import extract
+
+
+# Compares utils.extract.extract with the BeautifulSoup path parse_page used
+# to take: checks both find the same tokens and links on every page, then
+# prints the rate of both in pages and MB per second.
+#
+# Pages come from the stand-in's synthetic site, with relative links, a
+# <base> on some pages, and scripts and styles mixed in; a given html file is
+# checked and measured too.
+#
+# Run from the project root:
+#     python -m benchmarks.extract [--pages 500] [--file page.html]
+
+
+# The BeautifulSoup path, kept as the reference.
+def reference_extract(content, base_url=None):
+    soup = BeautifulSoup(content, "lxml")
+    base = soup.find("base", href=True)
+    if base is not None:
+        base_url = urljoin(base_url or "", base["href"].strip())
+    links = [
+        canonicalize(link.get("href"), base_url)
+        for link in soup.find_all("a", href=True)]
+    links = [
+        link for link in links
+        if link is not None and link.startswith(("http://", "https://"))]
+    return soup.get_text(), links
+
+
+def make_pages(count, seed):
+    # (url, html bytes) of [count] pages with relative and absolute links.
+    site = SyntheticSite()
+    rng = random.Random(seed)
+    pages = list()
+    for i in range(count):
+        host = rng.choice(site.hosts)
+        url = f"https://{host}/dir{i % 7}/page/{i}/"
+        _, html = site.page(url)
+        extra = "".join(
+            rng.choice([
+                f'<a href="../page/{rng.randrange(1000)}">up</a>',
+                f'<a href="sub/{rng.choice(WORDS)}.html#part">down</a>',
+                f'<a href="/{rng.choice(WORDS)}?b=2&amp;a=1">root</a>',
+                f'<a href="//{host}/x/./y/../z">scheme relative</a>',
+                f'<a href="mailto:{rng.choice(WORDS)}@uci.edu">mail</a>',
+                '<a href="javascript:void(0)">script</a>',
+                '<a href="http://[::1">broken</a>',
+                f"<script>var {rng.choice(WORDS)} = 1;</script>",
+                f"<style>.{rng.choice(WORDS)} {{ color: red }}</style>",
+                f"<div>{rng.choice(WORDS)} <b>{rng.choice(WORDS)}</b></div>",
+            ])
+            for _ in range(30))
+        html = html.replace(b"</body>", extra.encode("utf-8") + b"</body>")
+        if i % 3 == 0:
+            html = html.replace(
+                b"<head>", f'<head><base href="https://{host}/based/">'.encode("utf-8"))
+        pages.append((url, html))
+    return pages
+
+
+def check(pages):
+    for url, content in pages:
+        expected_text, expected_links = reference_extract(content, url)
+        text, links = extract(content, url)
+        if tokenizer.count_tokens(text) != tokenizer.count_tokens(expected_text):
+            print(f"Tokens differ from the reference on {url}.")
+            sys.exit(1)
+        if links != expected_links:
+            print(f"Links differ from the reference on {url}:")
+            print(f"    {links}\n    {expected_links}")
+            sys.exit(1)
+    print(f"extract matches the reference on {len(pages)} pages.")
+
+
+def measure(name, run, pages, repeat):
+    size = sum(len(content) for _, content in pages)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for url, content in pages:
+            run(content, url)
+    elapsed = time.perf_counter() - start
+    print(f"{name:>10}: {len(pages) * repeat / elapsed:10.1f} pages/sec "
+          f"{size * repeat / elapsed / 1e6:8.2f} MB/sec")
+
+
+def main(args):
+    pages = make_pages(args.pages, args.seed)
+    if args.file:
+        with open(args.file, "rb") as file:
+            pages.append(("https://www.ics.uci.edu/", file.read()))
+    check(pages)
+    measure("reference", reference_extract, pages, args.repeat)
+    measure("extract", extract, pages, args.repeat)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--file", type=str, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
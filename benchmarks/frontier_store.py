@@ -0,0 +1,49 @@
+import os
+import time
+import tempfile
+
+from argparse import ArgumentParser
+
+from benchmarks import load_config
+from crawler.frontier import Frontier
+
+
+# Measures how many urls per second the frontier can add and complete with
+# each save file backend. Pages are simulated as one completed url followed
+# by --links new urls, which is the write pattern Worker.run produces.
+#
+# Run from the project root:
+#     python -m benchmarks.frontier_store --urls 20000 --links 200
+
+
+def run(store, urls, links, batch_size, batch_interval):
+    with tempfile.TemporaryDirectory() as directory:
+        config = load_config(
+            save_file=os.path.join(directory, "frontier.save"),
+            store=store, batch_size=batch_size, batch_interval=batch_interval,
+            time_delay=0)
+        frontier = Frontier(config, True)
+        start = time.perf_counter()
+        for i in range(urls):
+            frontier.add_url(f"https://www.ics.uci.edu/page/{i}")
+            if i % links == 0:
+                frontier.mark_url_complete(f"https://www.ics.uci.edu/page/{i}")
+        frontier.close()
+        return urls / (time.perf_counter() - start)
+
+
+def main(args):
+    for store in args.stores:
+        rate = run(
+            store, args.urls, args.links, args.batch_size, args.batch_interval)
+        print(f"{store:>8}: {rate:12.1f} urls/sec")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=20000)
+    parser.add_argument("--links", type=int, default=200)
+    parser.add_argument("--batch_size", type=int, default=1000)
+    parser.add_argument("--batch_interval", type=float, default=5)
+    parser.add_argument("--stores", nargs="+", default=["shelve", "sqlite"])
+    main(parser.parse_args())
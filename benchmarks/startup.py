@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import statistics
+import subprocess
+
+from argparse import ArgumentParser
+
+from benchmarks import load_config
+
+
+# Measures how long the crawler takes to start:
+#
+#     import    importing launch.py in a new process, and for comparison the
+#               modules it no longer imports up front
+#     workers   creating --threads workers, which check the scraper source
+#     register  get_cache_server with a cached registration
+#     resume    opening a save file of --urls urls, half of them completed,
+#               with eager and stream resume, and the time to the first url
+#
+# Run from the project root:
+#     python -m benchmarks.startup [--urls 500] [--stores shelve sqlite]
+#
+# The save files are built url by url through the frontier. The shelve store
+# slows down as its file grows, from about 900 urls per second at 500 urls to
+# about 130 at 5000, so raise --urls for sqlite alone.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ["spacetime", "requests", "cbor", "bs4"]
+
+
+def import_time(module, repeat):
+    # Median seconds to import [module] in a new process, or None if the
+    # import fails, e.g. because it is not installed.
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        path for path in (ROOT, env.get("PYTHONPATH")) if path)
+    code = (f"import time; start = time.perf_counter(); import {module}; "
+            f"print(time.perf_counter() - start)")
+    times = list()
+    with tempfile.TemporaryDirectory() as directory:
+        for _ in range(repeat):
+            # In a directory of its own, for the Logs/ made on import.
+            process = subprocess.run(
+                [sys.executable, "-c", code], cwd=directory, env=env,
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            if process.returncode != 0:
+                return None
+            times.append(float(process.stdout))
+    return statistics.median(times)
+
+
+def worker_time(threads):
+    from crawler.worker import Worker
+    config = load_config()
+    start = time.perf_counter()
+    for worker_id in range(threads):
+        Worker(worker_id, config, None)
+    return time.perf_counter() - start
+
+
+def register_time(directory):
+    from utils.server_registration import get_cache_server
+    config = load_config(
+        save_file=os.path.join(directory, "frontier.save"),
+        registration_ttl=3600)
+    with open(f"{config.save_file}.cache_server", "w") as file:
+        json.dump({"key": [config.user_agent, config.host, config.port],
+                   "time": time.time(), "address": ["localhost", 9001]}, file)
+    start = time.perf_counter()
+    get_cache_server(config, False)
+    return time.perf_counter() - start
+
+
+def resume_times(directory, store, urls):
+    # Returns {resume mode: (seconds to open, seconds to the first url)}.
+    from crawler.frontier import Frontier
+    config = load_config(
+        save_file=os.path.join(directory, f"frontier-{store}.save"),
+        store=store, time_delay=0)
+    frontier = Frontier(config, True)
+    for i in range(urls):
+        url = f"https://host{i % 50}.ics.uci.edu/page/{i}"
+        frontier.add_url(url)
+        if i % 2:
+            frontier.mark_url_complete(url)
+    frontier.close()
+    times = dict()
+    for resume in ("eager", "stream"):
+        config.resume = resume
+        start = time.perf_counter()
+        frontier = Frontier(config, False)
+        opened = time.perf_counter() - start
+        frontier.get_tbd_url()
+        times[resume] = (opened, time.perf_counter() - start)
+        frontier.close()
+    return times
+
+
+def main(args):
+    seconds = import_time("launch", args.repeat)
+    result = "failed" if seconds is None else f"{seconds * 1000:9.1f} ms"
+    print(f"{'import launch':>20}: {result}")
+    for module in LAZY_MODULES:
+        seconds = import_time(module, args.repeat)
+        result = "not installed" if seconds is None else f"{seconds * 1000:9.1f} ms"
+        print(f"{f'import {module}':>20}: {result}  (lazy)")
+    print(f"{f'{args.threads} workers':>20}: {worker_time(args.threads) * 1000:9.1f} ms")
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'cached registration':>20}: "
+              f"{register_time(directory) * 1000:9.1f} ms")
+        for store in args.stores:
+            for resume, (opened, first) in resume_times(
+                    directory, store, args.urls).items():
+                print(f"{f'{store} {resume}':>20}: {opened * 1000:9.1f} ms "
+                      f"to open, {first * 1000:9.1f} ms to the first url")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--urls", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--stores", nargs="+", default=["shelve", "sqlite"])
+    main(parser.parse_args())
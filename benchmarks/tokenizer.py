@@ -0,0 +1,110 @@
+import sys
+import time
+import random
+
+from argparse import ArgumentParser
+from collections import Counter
+
+import tokenizer
+
+
+# Checks that tokenizer._tokenize_string and tokenizer.count_tokens give
+# exactly the tokens of the original character by character implementation,
+# then compares their speed on ascii and on non-ascii text.
+#
+# The check covers every unicode code point alone and between separators,
+# random mixes of ascii, accented, CJK, digit, combining and case-changing
+# characters, and a given text file if any. Exits with status 1 on the first
+# difference.
+#
+# Run from the project root:
+#     python -m benchmarks.tokenizer [--file page.txt]
+
+
+# The original tokenizer, kept as the reference.
+def reference_tokenize_string(string):
+    token_chars = []
+
+    for char in string.lower():
+        if char.isalnum():
+            token_chars.append(char)
+        else:
+            if len(token_chars) != 0: yield ''.join(token_chars)
+            token_chars = []
+
+    if len(token_chars) != 0: yield ''.join(token_chars) # For last token.
+
+
+ALPHABET = (
+    "abcXYZ019_ -.,;'\"\t\n"
+    "éÉñÑßẞİıΣσςſǅﬁÅ"
+    "٣٤५१²³½Ⅻ"
+    "中文字日本語한국어"
+    "́̇‍  ")
+
+
+def check(text, name):
+    expected = list(reference_tokenize_string(text))
+    if tokenizer._tokenize_string(text) != expected:
+        print(f"_tokenize_string differs from the reference on {name}.")
+        sys.exit(1)
+    if tokenizer.count_tokens(text) != Counter(expected):
+        print(f"count_tokens differs from the reference on {name}.")
+        sys.exit(1)
+
+
+def check_equivalence(file_text, seed):
+    for code_point in range(sys.maxunicode + 1):
+        char = chr(code_point)
+        if 0xD800 <= code_point <= 0xDFFF:
+            continue # Surrogates cannot appear in decoded text.
+        check(f"a{char}b {char} {char}{char}", f"U+{code_point:04X}")
+    rng = random.Random(seed)
+    ascii_alphabet = "".join(map(chr, range(128)))
+    for alphabet in (ALPHABET, ascii_alphabet):
+        for i in range(2000):
+            text = "".join(
+                rng.choice(alphabet) for _ in range(rng.randrange(200)))
+            check(text, f"random text {text!r}")
+    if file_text:
+        check(file_text, "the given file")
+    print("Tokenizer matches the reference on all inputs.")
+
+
+def measure(name, count, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        count(text)
+    rate = len(text) * repeat / (time.perf_counter() - start) / 1e6
+    print(f"{name:>22}: {rate:8.2f} MB/sec")
+
+
+def main(args):
+    file_text = None
+    if args.file:
+        with open(args.file, encoding="utf-8", errors="replace") as file:
+            file_text = file.read()
+    check_equivalence(file_text, args.seed)
+
+    rng = random.Random(args.seed)
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(6))
+             for _ in range(2000)]
+    text = file_text or " ".join(rng.choice(words) for _ in range(200000))
+    # Counting every token is what a page costs in extract_next_links.
+    measure(
+        "reference",
+        lambda text: Counter(reference_tokenize_string(text)),
+        text, args.repeat)
+    measure("count_tokens", tokenizer.count_tokens, text, args.repeat)
+    measure(
+        "count_tokens (unicode)",
+        lambda text: tokenizer.count_tokens(text + "é"),
+        text, args.repeat)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--file", type=str, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
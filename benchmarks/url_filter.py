@@ -0,0 +1,83 @@
+import os
+import re
+import time
+
+from argparse import ArgumentParser
+from urllib.parse import urlparse
+
+from utils.url_filter import UrlFilter, BLACKLIST_PATTERN
+
+
+# Compares utils.url_filter.UrlFilter with the static checks scraper.is_valid
+# used to make, over a corpus of links, one url per line. The default corpus
+# is benchmarks/data/links.txt, a sample of links found on the seed domains;
+# any file of urls works, e.g. links grepped out of Logs/Worker.log.
+#
+# Prints the urls the two disagree on, then the rate of both.
+#
+# Run from the project root:
+#     python -m benchmarks.url_filter [--corpus links.txt] [--repeat 2000]
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "links.txt")
+
+
+VALID_DOMAIN_PATTERN = re.compile(".*((\\.ics\\.uci\\.edu\\/)|(\\.cs\\.uci\\.edu\\/)|(\\.informatics\\.uci\\.edu\\/)|(\\.stat\\.uci\\.edu\\/)|(today\\.uci\\.edu\\/department\\/information_computer_sciences\\/)).*")
+VALID_DOMAIN_PATTERN2 = re.compile(".*((\\.ics\\.uci\\.edu)|(\\.cs\\.uci\\.edu)|(\\.informatics\\.uci\\.edu)|(\\.stat\\.uci\\.edu)|(today\\.uci\\.edu\\/department\\/information_computer_sciences)).*")
+
+
+# The static part of the original scraper.is_valid, kept as the reference.
+def reference_is_valid(url):
+    parsed = urlparse(url)
+    domain = str(parsed.hostname)
+    if parsed.scheme not in set(["http", "https"]):
+        return False
+    elif VALID_DOMAIN_PATTERN.fullmatch(domain) == None and VALID_DOMAIN_PATTERN2.fullmatch(domain) == None:
+        return False
+    elif BLACKLIST_PATTERN.search(url) != None:
+        return False
+    return not re.match(
+        r".*\.(css|js|bmp|gif|jpe?g|ico"
+        + r"|png|tiff?|mid|mp2|mp3|mp4"
+        + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
+        + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
+        + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
+        + r"|epub|dll|cnf|tgz|sha1"
+        + r"|thmx|mso|arff|rtf|jar|csv"
+        + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
+
+
+def measure(name, run, links, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run(links)
+    rate = len(links) * repeat / (time.perf_counter() - start)
+    print(f"{name:>24}: {rate:12.0f} urls/sec")
+
+
+def main(args):
+    with open(args.corpus) as file:
+        links = [line.strip() for line in file if line.strip()]
+    url_filter = UrlFilter()
+
+    for link in links:
+        old, new = reference_is_valid(link), url_filter.check(link) is None
+        if old != new:
+            print(f"{'allowed' if new else 'rejected'} now, "
+                  f"{'allowed' if old else 'rejected'} before: {link}")
+
+    measure(
+        "reference is_valid",
+        lambda links: [link for link in links if reference_is_valid(link)],
+        links, args.repeat)
+    measure(
+        "UrlFilter.check",
+        lambda links: [link for link in links if url_filter.check(link) is None],
+        links, args.repeat)
+    measure("UrlFilter.filter", url_filter.filter, links, args.repeat)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--corpus", type=str, default=CORPUS)
+    parser.add_argument("--repeat", type=int, default=2000)
+    main(parser.parse_args())
@@ -1,18 +1,34 @@
+import scraper
 from utils import get_logger
+from utils.metrics import metrics
 from crawler.frontier import Frontier
 from crawler.worker import Worker
+from crawler.pipeline import ParsePipeline
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
         self.config = config
         self.logger = get_logger("CRAWLER")
+        scraper.init_state(config, restart)
         self.frontier = frontier_factory(config, restart)
         self.workers = list()
         self.worker_factory = worker_factory
+        self.pipeline = None
+        if config.parse_processes:
+            self.pipeline = ParsePipeline(config, self.frontier)
+        self.metrics_server = None
+        if config.metrics_port:
+            self.metrics_server = metrics.serve(config.metrics_port)
+        if config.metrics_file:
+            metrics.start_file(config.metrics_file, config.metrics_interval)
 
     def start_async(self):
+        # Workers only take a pipeline when there is one, so factories with
+        # the plain (worker_id, config, frontier) signature keep working.
+        pipeline = {"pipeline": self.pipeline} if self.pipeline else {}
         self.workers = [
-            self.worker_factory(worker_id, self.config, self.frontier)
+            self.worker_factory(
+                worker_id, self.config, self.frontier, **pipeline)
             for worker_id in range(self.config.threads_count)]
         for worker in self.workers:
             worker.start()
@@ -21,6 +37,23 @@ class Crawler(object):
         self.start_async()
         self.join()
 
+    def stop(self):
+        # Workers stop once the urls they are crawling are done; join() then
+        # saves the frontier and the scraper state as a checkpoint to resume
+        # from, and writes the report.
+        self.logger.info("Stopping once the urls being crawled are done.")
+        self.frontier.stop()
+
     def join(self):
         for worker in self.workers:
             worker.join()
+        if self.pipeline:
+            self.pipeline.close()
+        if self.config.metrics_file:
+            metrics.stop_file.set()
+            metrics.save(self.config.metrics_file)
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        self.frontier.close()
+        scraper.save_state(self.config)
+        scraper.log_results(self.config)
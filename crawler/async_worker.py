@@ -0,0 +1,56 @@
+import time
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
+from crawler.worker import Worker
+from utils.async_download import CacheClient
+
+
+class AsyncWorker(Worker):
+    # Worker that keeps up to config.max_inflight downloads in flight over a
+    # pool of keep-alive connections to the cache server. Blocking frontier
+    # calls and the scraper run on a thread pool so they do not stall the
+    # event loop.
+    def run(self):
+        asyncio.run(self._crawl())
+
+    async def _crawl(self):
+        client = CacheClient(self.config, self.logger)
+        with ThreadPoolExecutor(self.config.max_inflight) as executor:
+            try:
+                await asyncio.gather(*(
+                    self._fetch_loop(client, executor)
+                    for _ in range(self.config.max_inflight)))
+            finally:
+                client.close()
+
+    async def _fetch_loop(self, client, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            tbd_url = await loop.run_in_executor(
+                executor, self.frontier.get_tbd_url)
+            if not tbd_url:
+                if self.pipeline and await loop.run_in_executor(
+                        executor, self.pipeline.drain):
+                    # Pages still being parsed may have added urls.
+                    continue
+                self.logger.info("Frontier is empty. Stopping fetch loop.")
+                break
+            try:
+                refresh = await loop.run_in_executor(
+                    executor, self.refresh, tbd_url)
+                start = time.perf_counter()
+                resp = await client.download(tbd_url, refresh)
+                await loop.run_in_executor(
+                    executor, self.frontier.record_response, tbd_url,
+                    resp.status, time.perf_counter() - start)
+                self.logger.info(
+                    f"Downloaded {tbd_url}, status <{resp.status}>, "
+                    f"using cache {self.config.cache_server}.")
+                await loop.run_in_executor(executor, self.scrape, tbd_url, resp)
+            except Exception as e:
+                # Completed anyway, like in Worker.run.
+                self.logger.error(f"Failed to crawl {tbd_url}: {e!r}")
+                await loop.run_in_executor(
+                    executor, self.frontier.mark_url_complete, tbd_url)
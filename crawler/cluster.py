@@ -0,0 +1,316 @@
+import json
+import uuid
+import socket
+
+from hashlib import blake2b
+from socketserver import ThreadingTCPServer, StreamRequestHandler
+from threading import Thread, Lock, Event
+from urllib.parse import urlparse
+
+from utils import get_logger, canonicalize
+from utils.dedup import make_dedup_set
+from crawler.frontier import Frontier
+import scraper
+
+
+# Crawling with several nodes, each owning a partition of the hosts.
+#
+# A url belongs to the node partition_of gives its hostname, so all urls of a
+# host are crawled by one node and politeness per host still holds. Every node
+# runs a DistributedFrontier with its own save file. Urls a node finds for
+# another partition are buffered per owner and forwarded in batches over TCP,
+# one JSON message per line:
+#
+#     {"type": "urls", "node": n, "session": s, "batch": b,
+#      "urls": [[url, depth, parent words], ...]}
+#                         answered with {"type": "ack"} once they are added
+#     {"type": "status"}  answered with {"idle": bool, "sent": n, "received": n}
+#     {"type": "done"}    answered with {"type": "done"}
+#     {"type": "report", "node": n, "report": scraper.report()}
+#                         answered with {"type": "ack"}
+#
+# A batch counts as sent once the owner acknowledges it. Until then it is
+# kept and sent again, on a new connection, before any newer batch; the
+# owner skips a batch it already added, by the number the sender gives its
+# batches in a session. The owner also decides whether a forwarded url is
+# new and within the crawl budgets (scraper.admit_forwarded), so budgets and
+# dedup sets hold for a host as a whole, not per node that found its urls.
+#
+# Node 0 detects the end of the crawl: it asks every node for its status, and
+# once all nodes are idle and as many urls were received as sent, twice in a
+# row with the same counts, no url can be in transit any more and it tells
+# every node it is done. The other nodes then send it their reports, which
+# it adds to its own results.
+
+
+def partition_of(url, node_count):
+    hostname = urlparse(url).hostname or ""
+    digest = blake2b(hostname.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % node_count
+
+
+def _send_message(address, message, timeout):
+    # Sends one message on a new connection and returns the reply, if any.
+    with socket.create_connection(address, timeout) as connection:
+        file = connection.makefile("rwb")
+        file.write(json.dumps(message).encode("utf-8") + b"\n")
+        file.flush()
+        line = file.readline()
+        return json.loads(line) if line else None
+
+
+class ClusterTransport(object):
+    def __init__(self, config, frontier):
+        self.logger = get_logger(f"CLUSTER-{config.node_id}", "CLUSTER")
+        self.config = config
+        self.frontier = frontier
+        self.node_id = config.node_id
+        self.nodes = config.cluster_nodes # List of (host, port).
+        self.lock = Lock()
+        self.outgoing = {node: list() for node in range(len(self.nodes))}
+        self.unacked = dict() # node -> (number, urls) of the batch in transit.
+        self.batches = 0 # Number of the last batch made.
+        self.session = uuid.uuid4().hex # Tells the batches of a restart apart.
+        self.connections = dict() # node -> (socket, file) of a peer.
+        self.send_lock = Lock() # Held while writing to a peer.
+        self.receive_lock = Lock() # Held while adding a forwarded batch.
+        self.added = dict() # (node, session) -> number of its last batch added.
+        self.sent = 0
+        self.received = 0
+        self.reports = dict() # node -> report, on node 0.
+        self.reported = Event() # Set on node 0 once all nodes reported.
+        self.done = Event()
+        self.server = None
+
+    def start(self):
+        transport = self
+
+        class Handler(StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    reply = transport._handle(json.loads(line))
+                    if reply is not None:
+                        self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+                        self.wfile.flush()
+
+        ThreadingTCPServer.allow_reuse_address = True
+        self.server = ThreadingTCPServer(self.nodes[self.node_id], Handler)
+        self.server.daemon_threads = True
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        Thread(target=self._flush_loop, daemon=True).start()
+        if self.node_id == 0:
+            Thread(target=self._detect_done, daemon=True).start()
+        self.logger.info(
+            f"Node {self.node_id} of {len(self.nodes)} listening on "
+            f"{self.nodes[self.node_id][0]}:{self.nodes[self.node_id][1]}.")
+
+    def _handle(self, message):
+        if message["type"] == "urls":
+            sender = (message["node"], message["session"])
+            with self.receive_lock:
+                # A batch sent again after its ack was lost is only acked.
+                if message["batch"] > self.added.get(sender, 0):
+                    for url, depth, parent_words in message["urls"]:
+                        self.frontier.add_forwarded(url, parent_words, depth)
+                    self.added[sender] = message["batch"]
+                    with self.lock:
+                        self.received += len(message["urls"])
+            return {"type": "ack"}
+        if message["type"] == "status":
+            return self.status()
+        if message["type"] == "done":
+            self._finish()
+            return message
+        if message["type"] == "report":
+            with self.lock:
+                self.reports[message["node"]] = message["report"]
+                if len(self.reports) == len(self.nodes) - 1:
+                    self.reported.set()
+            return {"type": "ack"}
+        raise ValueError(f"Unknown cluster message {message['type']!r}.")
+
+    def forward(self, node, url, depth, parent_words):
+        with self.lock:
+            batch = self.outgoing[node]
+            batch.append((url, depth, parent_words))
+            full = len(batch) >= self.config.forward_batch
+        if full:
+            self._flush(node)
+
+    def _flush(self, node):
+        # Sends the batch in transit to [node] again, or else the next one.
+        # Its urls only count as sent once [node] acknowledges them, and as
+        # pending until then, so a batch on its way is never mistaken for the
+        # end of the crawl.
+        with self.send_lock:
+            with self.lock:
+                if node not in self.unacked:
+                    if not self.outgoing[node]:
+                        return
+                    self.batches += 1
+                    self.unacked[node] = (self.batches, self.outgoing[node])
+                    self.outgoing[node] = list()
+                number, batch = self.unacked[node]
+            message = json.dumps({
+                "type": "urls", "node": self.node_id, "session": self.session,
+                "batch": number, "urls": batch}).encode("utf-8") + b"\n"
+            try:
+                if node not in self.connections:
+                    connection = socket.create_connection(
+                        self.nodes[node], self.config.timeout)
+                    self.connections[node] = (connection, connection.makefile("rwb"))
+                file = self.connections[node][1]
+                file.write(message)
+                file.flush()
+                if not file.readline():
+                    raise ConnectionError("Connection closed before the ack.")
+            except OSError as e:
+                # The peer may not be up yet, or went away; the batch goes
+                # out again with the next flush.
+                self.logger.warning(f"Could not forward to node {node}: {e!r}")
+                connection = self.connections.pop(node, None)
+                if connection is not None:
+                    connection[0].close()
+                return
+            with self.lock:
+                del self.unacked[node]
+                self.sent += len(batch)
+
+    def _flush_loop(self):
+        while not self.done.wait(self.config.forward_interval):
+            for node in self.outgoing:
+                self._flush(node)
+
+    def status(self):
+        with self.lock:
+            pending = bool(self.unacked) or any(self.outgoing.values())
+            sent, received = self.sent, self.received
+        idle = not pending and self.frontier.is_idle()
+        return {"idle": idle, "sent": sent, "received": received}
+
+    def _detect_done(self):
+        previous = None
+        while not self.done.wait(self.config.forward_interval):
+            statuses = list()
+            for node, address in enumerate(self.nodes):
+                if node == self.node_id:
+                    statuses.append(self.status())
+                    continue
+                try:
+                    statuses.append(_send_message(
+                        address, {"type": "status"}, self.config.timeout))
+                except OSError:
+                    statuses.append(None)
+            if None in statuses or not all(status["idle"] for status in statuses):
+                previous = None
+                continue
+            counts = [(status["sent"], status["received"]) for status in statuses]
+            if sum(sent for sent, _ in counts) != sum(received for _, received in counts):
+                previous = None
+                continue
+            if counts != previous:
+                previous = counts
+                continue
+            for node, address in enumerate(self.nodes):
+                if node != self.node_id:
+                    try:
+                        _send_message(address, {"type": "done"}, self.config.timeout)
+                    except OSError as e:
+                        self.logger.error(f"Could not stop node {node}: {e!r}")
+            self._finish()
+
+    def _finish(self):
+        self.logger.info(f"Cluster is done, stopping node {self.node_id}.")
+        self.done.set()
+        with self.frontier.lock:
+            self.frontier.has_ready.notify_all()
+
+    def report(self):
+        # Sends the report of this node to node 0, at the end of the crawl.
+        try:
+            _send_message(
+                self.nodes[0], {"type": "report", "node": self.node_id,
+                                "report": scraper.report()},
+                self.config.timeout)
+        except OSError as e:
+            self.logger.error(f"Could not report to node 0: {e!r}")
+
+    def close(self):
+        self.done.set()
+        with self.send_lock:
+            for connection, file in self.connections.values():
+                file.close()
+                connection.close()
+            self.connections.clear()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class DistributedFrontier(Frontier):
+    # Frontier of one node: keeps the urls of its own partition and forwards
+    # the others. get_tbd_url only returns None once the whole cluster is
+    # done, since other nodes may still forward urls.
+    def __init__(self, config, restart):
+        self.transport = ClusterTransport(config, self)
+        # Urls already forwarded, so the links every page of a site has are
+        # not sent to their owner for each page again.
+        self.forwarded = make_dedup_set(
+            config.expected_urls, config.dedup_fp_rate, config.dedup_bloom)
+        node_count, node_id = len(config.cluster_nodes), config.node_id
+        scraper.owns = lambda url: partition_of(url, node_count) == node_id
+        super().__init__(config, restart)
+        self.transport.start()
+
+    def add_url(self, url, parent=None, parent_words=0, depth=None):
+        url = canonicalize(url)
+        if url is None:
+            return
+        owner = partition_of(url, len(self.transport.nodes))
+        if owner == self.transport.node_id:
+            super().add_url(url, parent, parent_words, depth)
+            return
+        if not self.forwarded.add(url):
+            return
+        if depth is None:
+            with self.lock:
+                depth = self.depths[parent] + 1 if parent in self.depths else 0
+        self.transport.forward(owner, url, depth, parent_words)
+
+    def add_forwarded(self, url, parent_words, depth):
+        # Adds a url another node found, if this node has not seen it yet
+        # and it is within the crawl budgets.
+        if scraper.admit_forwarded(url):
+            super().add_url(url, parent_words=parent_words, depth=depth)
+
+    def is_idle(self):
+        # True if nothing is queued or being crawled on this node.
+        with self.lock:
+            return not (self.ready_hosts or self.waiting_hosts
+                        or self.loading or self.depths)
+
+    def get_tbd_url(self):
+        while True:
+            url = super().get_tbd_url()
+            if url is not None:
+                return url
+            with self.lock:
+                if self.transport.done.is_set() or self.stopping:
+                    return None
+                # Woken up by forwarded urls or by the end of the crawl.
+                self.has_ready.wait(self.config.forward_interval)
+
+    def close(self):
+        # At the end of the crawl node 0 waits for the reports of the others
+        # before scraper.log_results writes the results.
+        if self.transport.done.is_set():
+            if self.transport.node_id == 0:
+                if not self.transport.reported.wait(self.config.timeout):
+                    self.transport.logger.error(
+                        "Not all nodes reported, the results are incomplete.")
+                with self.transport.lock:
+                    scraper.remote_reports = list(self.transport.reports.values())
+            else:
+                self.transport.report()
+        self.transport.close()
+        super().close()
@@ -1,18 +1,99 @@
 import os
-import shelve
+import time
+import heapq
+import shutil
+import tempfile
 
-from threading import Thread, RLock
+from collections import Counter, deque
+from threading import Thread, RLock, Condition
 from queue import Queue, Empty
+from urllib.parse import urlparse
 
-from utils import get_logger, get_urlhash, normalize
-from scraper import is_valid
+from utils import get_logger, get_urlhash, canonicalize
+from utils.dedup import make_dedup_set
+from utils.metrics import metrics
+from crawler.store import open_store, remove_store
+from crawler.policy import make_policy
+from crawler.spill_queue import SpillQueue
+from crawler.recrawl import RecrawlSchedule, UrlMeta
+from crawler.rate import HostRateController
+from scraper import is_allowed
+
+# Seconds over which the fetch rate is measured.
+FETCH_RATE_WINDOW = 60
 
 class Frontier(object):
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
-        self.to_be_downloaded = list()
-        
+
+        # Politeness is enforced per host: every host has its own queue of
+        # urls and the earliest time it may be fetched from again. Hosts
+        # that have urls but must wait sit in a heap ordered by that time;
+        # hosts past it sit in a heap ordered by the priority the scheduling
+        # policy gives them (see crawler/policy.py). A host being fetched
+        # from is in neither heap: the delay only starts once the download
+        # is done, so a slow host never has two fetches at once.
+        self.lock = RLock()
+        self.has_ready = Condition(self.lock)
+        self.policy = make_policy(config)
+        self.sequence = 0 # Order in which urls were added.
+        # host -> SpillQueue of (priority, url, checked, depth).
+        self.host_queues = dict()
+        self.next_fetch = dict() # host -> earliest time of next fetch.
+        self.fetched = Counter() # host -> urls handed out.
+        self.waiting_hosts = list() # Heap of (next fetch time, host).
+        self.ready_hosts = list() # Heap of (host priority, host).
+        self.ready_priority = dict() # host -> its current entry in ready_hosts.
+        self.fetching = dict() # host -> url being downloaded from it.
+        self.depths = dict() # Url handed out -> its depth.
+        self.recent_fetches = deque() # Times urls were handed out, for metrics.
+
+        # Queues keep at most config.memory_urls urls in memory together;
+        # beyond that, the worse half of the largest queue goes to disk.
+        self.in_memory = 0
+        self.spill_dir = None
+
+        # Urls loaded by _stream_save_file are only checked with is_allowed
+        # once they are handed out, so queues hold (url, checked) pairs.
+        self.loading = False
+        self.loader = None
+        # Set by stop(): no more urls are handed out.
+        self.stopping = False
+        self.started = time.time()
+        self.time_to_first_fetch = None
+
+        # In incremental mode, completed urls are fetched again once due, and
+        # fetches holds the UrlMeta of urls downloaded but not completed yet.
+        self.recrawl = None
+        if config.incremental:
+            self.recrawl = RecrawlSchedule(
+                config.recrawl_initial, config.recrawl_min, config.recrawl_max)
+        self.fetches = dict()
+
+        # With adaptive politeness, the delay of every host comes from its
+        # response times and errors (see crawler/rate.py) instead of
+        # config.time_delay.
+        self.rates = None
+        if config.adaptive:
+            self.rates = HostRateController(
+                config.min_delay, config.max_delay, config.latency_factor,
+                config.max_failures, config.suspend_time,
+                config.max_suspensions)
+
+        # Compact copy of the urlhashes in the save file, so add_url only
+        # has to go to the save file for urls that are actually new.
+        self.seen = make_dedup_set(
+            config.expected_urls, config.dedup_fp_rate, config.dedup_bloom)
+
+        metrics.gauge("frontier_queue_depth", self._queue_depths, label="host")
+        metrics.gauge("frontier_hosts", self._host_counts, label="state")
+        metrics.gauge("frontier_in_flight", lambda: len(self.depths))
+        metrics.gauge("host_fetches", self._host_fetches, label="host")
+        metrics.gauge("fetch_rate", self._fetch_rate)
+        if self.rates is not None:
+            metrics.gauge("host_delay", self._host_delays, label="host")
+
         if not os.path.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
             self.logger.info(
@@ -22,12 +103,17 @@ class Frontier(object):
             # Save file does exists, but request to start from seed.
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
+            remove_store(self.config.save_file)
         # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
+        self.save = open_store(self.config)
         if restart:
             for url in self.config.seed_urls:
                 self.add_url(url)
+        elif self.config.resume == "stream" and self.save:
+            # Start crawling right away and load the rest in the background.
+            self.loading = True
+            self.loader = Thread(target=self._stream_save_file, daemon=True)
+            self.loader.start()
         else:
             # Set the frontier state with contents of save file.
             self._parse_save_file()
@@ -37,36 +123,347 @@ class Frontier(object):
 
     def _parse_save_file(self):
         ''' This function can be overridden for alternate saving techniques. '''
-        total_count = len(self.save)
+        total_count = 0
         tbd_count = 0
-        for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.append(url)
-                tbd_count += 1
+        recrawl_count = 0
+        with self.lock:
+            for chunk in self.save.chunks(self.config.resume_chunk):
+                for urlhash, url, completed, meta in chunk:
+                    self.seen.add(urlhash)
+                    if not completed and is_allowed(url):
+                        self._enqueue(url)
+                        tbd_count += 1
+                    elif completed and self._due(meta):
+                        self._enqueue(url)
+                        recrawl_count += 1
+                total_count += len(chunk)
         self.logger.info(
-            f"Found {tbd_count} urls to be downloaded from {total_count} "
-            f"total urls discovered.")
+            f"Found {tbd_count} urls to be downloaded and {recrawl_count} "
+            f"to be downloaded again from {total_count} total urls "
+            f"discovered.")
 
-    def get_tbd_url(self):
+    def _stream_save_file(self):
+        # Loads pending urls chunk by chunk while workers are already
+        # crawling. Only the lock is held per chunk, not the whole load.
+        total_count = 0
+        tbd_count = 0
+        recrawl_count = 0
+        chunks = self.save.chunks(self.config.resume_chunk)
         try:
-            return self.to_be_downloaded.pop()
-        except IndexError:
+            while True:
+                with self.lock:
+                    chunk = None if self.stopping else next(chunks, None)
+                    if chunk is None:
+                        break
+                    for urlhash, url, completed, meta in chunk:
+                        self.seen.add(urlhash)
+                        if not completed:
+                            self._enqueue(url, checked=False)
+                            tbd_count += 1
+                        elif self._due(meta):
+                            self._enqueue(url)
+                            recrawl_count += 1
+                    total_count += len(chunk)
+        finally:
+            # Closed here, under the lock, when stop() ends the loading
+            # early: the store writes what it held back while reading, which
+            # must not happen whenever the generator is collected.
+            with self.lock:
+                chunks.close()
+        with self.lock:
+            self.loading = False
+            # Wake up workers waiting for urls so they can stop.
+            self.has_ready.notify_all()
+        self.logger.info(
+            f"Loaded {tbd_count} urls to be downloaded and {recrawl_count} "
+            f"to be downloaded again from {total_count} total urls "
+            f"discovered in {time.time() - self.started:.2f}s.")
+
+    def _due(self, meta):
+        # True if a completed url with [meta] should be fetched again.
+        return self.recrawl is not None and self.recrawl.due(
+            UrlMeta(*meta) if meta else None, self.started)
+
+    def _enqueue(self, url, checked=True, depth=0, parent_words=0):
+        # Must be called with the lock held. Returns False if the policy
+        # drops the url.
+        self.sequence += 1
+        priority = self.policy.priority(depth, parent_words, self.sequence)
+        if priority is None:
+            return False
+        host = urlparse(url).hostname
+        queue = self.host_queues.get(host)
+        if queue is None:
+            queue = self.host_queues[host] = SpillQueue()
+        if not queue and host not in self.fetching:
+            # Host had nothing waiting, so it is not in a heap yet.
+            heapq.heappush(
+                self.waiting_hosts, (self.next_fetch.get(host, 0), host))
+            self.has_ready.notify()
+        queue.push((priority, url, checked, depth))
+        self.in_memory += 1
+        if host in self.ready_priority and queue.peek()[0] == priority:
+            # The url is the best of a ready host: the host moves up.
+            self._make_ready(host)
+        if self.in_memory > self.config.memory_urls:
+            self._spill()
+        return True
+
+    def _make_ready(self, host):
+        # Must be called with the lock held. Entries of a host that are not
+        # its current one are skipped by get_tbd_url.
+        priority = self.policy.host_priority(
+            self.host_queues[host].peek()[0], self.fetched[host])
+        self.ready_priority[host] = priority
+        heapq.heappush(self.ready_hosts, (priority, host))
+
+    def _spill(self):
+        # Must be called with the lock held.
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(
+                prefix=f"{os.path.basename(self.config.save_file)}.spill-",
+                dir=os.path.dirname(os.path.abspath(self.config.save_file)))
+        largest = max(self.host_queues.values(), key=SpillQueue.in_memory)
+        self.in_memory -= largest.spill(self.spill_dir)
+
+    def _pop_url(self, host):
+        # Must be called with the lock held.
+        queue = self.host_queues[host]
+        in_memory = queue.in_memory()
+        _, url, checked, depth = queue.pop()
+        self.in_memory -= in_memory - queue.in_memory()
+        return url, checked, depth
+
+    def _requeue_host(self, host, ready_at):
+        # Must be called with the lock held, after taking host off the heaps.
+        queue = self.host_queues[host]
+        if not queue:
+            queue.close()
+            del self.host_queues[host]
+        elif ready_at > time.time():
+            heapq.heappush(self.waiting_hosts, (ready_at, host))
+            self.has_ready.notify()
+        else:
+            self._make_ready(host)
+
+    def get_tbd_url(self):
+        # Blocks until some host is allowed to be fetched from again, and
+        # returns the url the policy puts first of the hosts that are.
+        # Returns None when no urls are left and none are being crawled,
+        # since those may still add urls, or once stop() was called.
+        with self.lock:
+            while (self.ready_hosts or self.waiting_hosts or self.loading
+                   or self.depths):
+                if self.stopping:
+                    return None
+                now = time.time()
+                while self.waiting_hosts and self.waiting_hosts[0][0] <= now:
+                    _, host = heapq.heappop(self.waiting_hosts)
+                    ready_at = self.next_fetch.get(host, 0)
+                    if ready_at > now:
+                        # Its delay grew while it was waiting.
+                        heapq.heappush(self.waiting_hosts, (ready_at, host))
+                    else:
+                        self._make_ready(host)
+                if not self.ready_hosts:
+                    if self.waiting_hosts:
+                        # Another thread may add a host that is ready sooner.
+                        self.has_ready.wait(self.waiting_hosts[0][0] - now)
+                    else:
+                        # The save file is still being streamed in, or
+                        # other workers are crawling urls.
+                        self.has_ready.wait()
+                    continue
+                priority, host = heapq.heappop(self.ready_hosts)
+                if self.ready_priority.get(host) != priority:
+                    continue # Replaced by a better entry of the host.
+                del self.ready_priority[host]
+                if self.next_fetch.get(host, 0) > now:
+                    # Its delay grew after it became ready.
+                    heapq.heappush(
+                        self.waiting_hosts, (self.next_fetch[host], host))
+                    continue
+                if self.rates is not None and self.rates.given_up(host):
+                    self._drop_host(host)
+                    continue
+                url, checked, depth = self._pop_url(host)
+                if not checked and not is_allowed(url):
+                    # Nothing was fetched, so the host keeps its turn.
+                    self._requeue_host(host, now)
+                    continue
+                self.fetched[host] += 1
+                self.recent_fetches.append(now)
+                self._trim_fetches(now)
+                # Back in a heap once the download is done, see _fetched.
+                self.fetching[host] = url
+                self.depths[url] = depth
+                if self.time_to_first_fetch is None:
+                    self.time_to_first_fetch = time.time() - self.started
+                    self.logger.info(
+                        f"Time to first fetch: "
+                        f"{self.time_to_first_fetch:.3f}s.")
+                return url
             return None
 
-    def add_url(self, url):
-        url = normalize(url)
-        urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            self.save[urlhash] = (url, False)
-            self.save.sync()
-            self.to_be_downloaded.append(url)
-    
+    def add_url(self, url, parent=None, parent_words=0, depth=None):
+        # [parent] is the url handed out by get_tbd_url that links to [url],
+        # [parent_words] the number of words on it; both feed the
+        # scheduling policy. [depth] overrides the depth taken from parent.
+        url = canonicalize(url)
+        if url is None:
+            return
+        urlhash = get_urlhash(url, canonical=True)
+        with self.lock:
+            if depth is None:
+                depth = self.depths[parent] + 1 if parent in self.depths else 0
+            if urlhash in self.seen:
+                return
+            # Until loading is done, seen does not know the whole save file.
+            if self.loading and urlhash in self.save:
+                self.seen.add(urlhash)
+                return
+            if self._enqueue(url, depth=depth, parent_words=parent_words):
+                self.seen.add(urlhash)
+                with metrics.time("persist"):
+                    self.save[urlhash] = (url, False)
+
+    def _drop_host(self, host):
+        # Must be called with the lock held, after taking host off the heaps.
+        # Its urls stay in the save file for the next run.
+        queue = self.host_queues.pop(host)
+        self.in_memory -= queue.in_memory()
+        self.logger.warning(
+            f"Giving up on {host} after repeated failures, leaving "
+            f"{len(queue)} urls for the next run.")
+        queue.close()
+
+    def record_response(self, url, status, latency):
+        # Records that downloading [url] took [latency] seconds and ended
+        # with [status]: the politeness delay of its host starts now, and
+        # with adaptive politeness it follows the response.
+        host = urlparse(url).hostname
+        with self.lock:
+            now = time.time()
+            if self.rates is not None:
+                suspended = self.rates.suspended(host, now)
+                self.rates.record(host, status, latency, now)
+                if not suspended and self.rates.suspended(host, now):
+                    self.logger.warning(
+                        f"Suspending {host} until "
+                        f"{time.ctime(self.rates.ready_at(host, now))} after "
+                        f"repeated failures.")
+            self._fetched(url, host, now)
+
+    def _fetched(self, url, host, now):
+        # Must be called with the lock held. Puts [host], whose download of
+        # [url] ended at [now], back in a heap, unless that was done already.
+        if self.fetching.get(host) != url:
+            return
+        del self.fetching[host]
+        if self.rates is None:
+            ready_at = now + self.config.time_delay
+        else:
+            ready_at = self.rates.ready_at(host, now)
+        self.next_fetch[host] = max(self.next_fetch.get(host, 0), ready_at)
+        self._requeue_host(host, self.next_fetch[host])
+        self.has_ready.notify()
+
+    def was_completed(self, url):
+        # True if [url] was downloaded before, by an earlier crawl: in
+        # incremental mode it is being downloaded again.
+        urlhash = get_urlhash(url, canonical=True)
+        with self.lock:
+            return urlhash in self.save and self.save[urlhash][1]
+
+    def record_fetch(self, url, fingerprint):
+        # Records that [url] was downloaded with content [fingerprint] (see
+        # crawler/recrawl.py). Returns False if the content is the same as
+        # when it was downloaded before, True otherwise.
+        if self.recrawl is None:
+            return True
+        urlhash = get_urlhash(url, canonical=True)
+        with self.lock:
+            previous = None
+            if urlhash in self.save:
+                meta = self.save[urlhash][2]
+                previous = UrlMeta(*meta) if meta else None
+            self.fetches[url] = self.recrawl.update(
+                previous, fingerprint, time.time())
+        return (previous is None or fingerprint is None
+                or fingerprint != previous.fingerprint)
+
     def mark_url_complete(self, url):
-        urlhash = get_urlhash(url)
-        if urlhash not in self.save:
-            # This should not happen.
-            self.logger.error(
-                f"Completed url {url}, but have not seen it before.")
-
-        self.save[urlhash] = (url, True)
-        self.save.sync()
+        urlhash = get_urlhash(url, canonical=True)
+        with self.lock:
+            if urlhash not in self.seen:
+                # This should not happen.
+                self.logger.error(
+                    f"Completed url {url}, but have not seen it before.")
+
+            meta = self.fetches.pop(url, None)
+            with metrics.time("persist"):
+                if meta is None:
+                    self.save[urlhash] = (url, True)
+                else:
+                    self.save[urlhash] = (url, True, tuple(meta))
+            self.depths.pop(url, None)
+            # In case record_response was not called, e.g. when the
+            # download raised.
+            self._fetched(url, urlparse(url).hostname, time.time())
+            if not self.depths:
+                # Workers waiting for this url's links may have to stop.
+                self.has_ready.notify_all()
+
+    def stop(self):
+        # Stops handing out urls; get_tbd_url returns None from now on. Urls
+        # being crawled are still completed, and the rest stay in the save
+        # file for the next run.
+        with self.lock:
+            self.stopping = True
+            self.has_ready.notify_all()
+
+    # Gauges for utils/metrics.py.
+
+    def _queue_depths(self):
+        with self.lock:
+            return {host: len(queue) for host, queue in self.host_queues.items()}
+
+    def _host_counts(self):
+        with self.lock:
+            return {"ready": len(self.ready_priority),
+                    "waiting": len(self.waiting_hosts),
+                    "fetching": len(self.fetching)}
+
+    def _host_fetches(self):
+        with self.lock:
+            return dict(self.fetched)
+
+    def _host_delays(self):
+        with self.lock:
+            return {host: rate.delay for host, rate in self.rates.hosts.items()}
+
+    def _trim_fetches(self, now):
+        # Must be called with the lock held.
+        while self.recent_fetches and self.recent_fetches[0] < now - FETCH_RATE_WINDOW:
+            self.recent_fetches.popleft()
+
+    def _fetch_rate(self):
+        # Urls handed out per second over the last FETCH_RATE_WINDOW seconds.
+        with self.lock:
+            now = time.time()
+            self._trim_fetches(now)
+            window = min(FETCH_RATE_WINDOW, max(now - self.started, 1))
+            return len(self.recent_fetches) / window
+
+    def close(self):
+        # Commits anything the store still holds in memory, and deletes the
+        # queues spilled to disk.
+        self.stop()
+        if self.loader is not None:
+            self.loader.join()
+        with self.lock:
+            self.save.close()
+            for queue in self.host_queues.values():
+                queue.close()
+            if self.spill_dir is not None:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
@@ -0,0 +1,109 @@
+import time
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from queue import Queue
+from threading import Thread, Condition, BoundedSemaphore
+
+from utils import get_logger
+from utils.metrics import metrics
+import scraper
+
+
+# Staged pipeline that moves parsing off the fetch threads:
+#
+#     fetch threads --submit()--> process pool (scraper.parse_page)
+#                   --results--> merge thread (scraper.merge_page, frontier)
+#
+# Parsing runs in other processes, so it does not hold the GIL of the
+# crawler. Merging stays in this process and in one thread, which is the only
+# writer of the scraper statistics while the pipeline is in use. At most
+# config.parse_queue pages are between submit() and the merge thread; fetch
+# threads block in submit() beyond that, so a slow parser stage throttles
+# fetching instead of piling up pages in memory.
+
+class ParsePipeline(object):
+    def __init__(self, config, frontier):
+        self.logger = get_logger("PIPELINE")
+        self.config = config
+        self.frontier = frontier
+        # Spawned, not forked: forking while fetch threads hold locks can
+        # leave the children deadlocked.
+        self.pool = ProcessPoolExecutor(
+            config.parse_processes,
+            mp_context=multiprocessing.get_context("spawn"))
+        self.slots = BoundedSemaphore(config.parse_queue)
+        self.results = Queue(config.parse_queue)
+        self.pending = 0 # Pages submitted but not merged yet.
+        self.idle = Condition()
+        self.merger = Thread(target=self._merge_loop, daemon=True)
+        self.merger.start()
+
+    def submit(self, url, resp, recrawled=False):
+        # Called by fetch threads. Blocks while the pipeline is full.
+        # [recrawled] is passed on to scraper.merge_page.
+        if not scraper.should_parse(url, resp):
+            self.frontier.mark_url_complete(url)
+            return
+        self.slots.acquire()
+        with self.idle:
+            self.pending += 1
+        start = time.perf_counter()
+        try:
+            future = self.pool.submit(
+                scraper.parse_page, resp.raw_response.content,
+                scraper.page_url(url, resp))
+        except Exception:
+            # E.g. a broken pool. The page never reaches the merge thread,
+            # so give its slot back, or drain() would wait for it forever.
+            self._release()
+            raise
+        # Never blocks: results holds as many entries as there are slots.
+        future.add_done_callback(
+            lambda future: self._parsed(url, recrawled, future, start))
+
+    def _parsed(self, url, recrawled, future, start):
+        # The parse processes keep metrics of their own, which are never
+        # read, so parsing is timed here, including the wait for a process.
+        metrics.observe("parse", time.perf_counter() - start)
+        self.results.put((url, recrawled, future))
+
+    def _merge_loop(self):
+        while True:
+            url, recrawled, future = self.results.get()
+            if url is None:
+                break
+            try:
+                page = future.result()
+                links = scraper.merge_page(url, page, recrawled)
+                word_count = scraper.page_word_count(page)
+                for scraped_url in scraper.filter_links(links):
+                    self.frontier.add_url(
+                        scraped_url, parent=url, parent_words=word_count)
+            except Exception as e:
+                self.logger.error(f"Failed to parse {url}: {e!r}")
+            self.frontier.mark_url_complete(url)
+            self._release()
+
+    def _release(self):
+        # Frees the slot of a page that was submitted.
+        self.slots.release()
+        with self.idle:
+            self.pending -= 1
+            if not self.pending:
+                self.idle.notify_all()
+
+    def drain(self):
+        # Waits until every submitted page is merged. Returns True if there
+        # were any, in which case the frontier may have new urls.
+        with self.idle:
+            if not self.pending:
+                return False
+            self.idle.wait_for(lambda: not self.pending)
+            return True
+
+    def close(self):
+        self.drain()
+        self.results.put((None, False, None))
+        self.merger.join()
+        self.pool.shutdown()
@@ -0,0 +1,74 @@
+from math import log2
+
+
+# Scheduling policies of the frontier.
+#
+# A policy gives every url a priority when it is added, and every host a
+# priority when it may be fetched from again; of the hosts past their
+# politeness delay, the frontier fetches from the one with the lowest host
+# priority, and from that host the url with the lowest priority. Priorities
+# are tuples ending in a sequence number, so they never tie.
+#
+#     lifo   newest url first, the original depth first order.
+#     bfs    shallowest url first, oldest first within a depth.
+#     depth  bfs, dropping urls more than max_depth links from a seed.
+#     score  lowest depth * depth_weight - log2(1 + words) * word_weight
+#            first, where words is the word count of the page that linked
+#            to the url. Hosts are penalized by
+#            log2(1 + urls fetched from them) * host_weight, so one big host
+#            does not starve the others.
+
+
+class LifoPolicy(object):
+    def priority(self, depth, parent_words, sequence):
+        # Returns None for urls that should not be crawled.
+        return (-sequence,)
+
+    def host_priority(self, priority, fetched):
+        # [priority] is the one of the best url of the host, [fetched] the
+        # number of urls fetched from it so far.
+        return priority
+
+
+class BfsPolicy(LifoPolicy):
+    def priority(self, depth, parent_words, sequence):
+        return (depth, sequence)
+
+
+class DepthLimitedPolicy(BfsPolicy):
+    def __init__(self, max_depth):
+        self.max_depth = max_depth
+
+    def priority(self, depth, parent_words, sequence):
+        if depth > self.max_depth:
+            return None
+        return (depth, sequence)
+
+
+class ScorePolicy(LifoPolicy):
+    def __init__(self, depth_weight=1.0, word_weight=0.5, host_weight=0.5):
+        self.depth_weight = depth_weight
+        self.word_weight = word_weight
+        self.host_weight = host_weight
+
+    def priority(self, depth, parent_words, sequence):
+        score = (depth * self.depth_weight
+                 - log2(1 + parent_words) * self.word_weight)
+        return (score, sequence)
+
+    def host_priority(self, priority, fetched):
+        score, sequence = priority
+        return (score + log2(1 + fetched) * self.host_weight, sequence)
+
+
+def make_policy(config):
+    if config.policy == "lifo":
+        return LifoPolicy()
+    if config.policy == "bfs":
+        return BfsPolicy()
+    if config.policy == "depth":
+        return DepthLimitedPolicy(config.max_depth)
+    if config.policy == "score":
+        return ScorePolicy(
+            config.depth_weight, config.word_weight, config.host_weight)
+    raise ValueError(f"Unknown scheduling POLICY {config.policy!r}.")
@@ -0,0 +1,90 @@
+from utils.download import host_failed
+
+
+# Adaptive politeness per host.
+#
+# With config.adaptive set, the frontier asks a HostRateController how long
+# to wait between fetches from a host instead of always waiting
+# config.time_delay. The delay of a host follows latency_factor times its
+# smoothed response time, within [min_delay, max_delay], so slow hosts are
+# fetched from less often. Every failed fetch (no response, 429 or a 5xx, see
+# utils.download.host_failed) doubles the delay; the 6xx statuses of the cache
+# server are about the url, not the host, and count as responses. After
+# max_failures failures in a row the host is suspended for suspend_time
+# seconds, twice as long every time it fails again right after, and after more
+# than max_suspensions suspensions in a row the frontier gives up on it for
+# this run.
+
+
+class HostRate(object):
+    __slots__ = ("delay", "latency", "failures", "suspensions", "suspended_until")
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.latency = None # Smoothed response time, None before the first.
+        self.failures = 0 # In a row.
+        self.suspensions = 0 # In a row.
+        self.suspended_until = 0
+
+
+class HostRateController(object):
+    def __init__(self, min_delay, max_delay, latency_factor=2.0, max_failures=5,
+                 suspend_time=300, max_suspensions=3, smoothing=0.3):
+        self.min_delay = min_delay
+        self.max_delay = max(min_delay, max_delay)
+        self.latency_factor = latency_factor
+        self.max_failures = max_failures
+        self.suspend_time = suspend_time
+        self.max_suspensions = max_suspensions
+        self.smoothing = smoothing
+        self.hosts = dict() # host -> HostRate.
+
+    def _clamp(self, delay):
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def delay(self, host):
+        rate = self.hosts.get(host)
+        return self.min_delay if rate is None else rate.delay
+
+    def ready_at(self, host, now):
+        # Earliest time [host] may be fetched from again, for a fetch that
+        # ended at [now].
+        rate = self.hosts.get(host)
+        if rate is None:
+            return now + self.min_delay
+        return max(now + rate.delay, rate.suspended_until)
+
+    def suspended(self, host, now):
+        rate = self.hosts.get(host)
+        return rate is not None and rate.suspended_until > now
+
+    def given_up(self, host):
+        rate = self.hosts.get(host)
+        return rate is not None and rate.suspensions > self.max_suspensions
+
+    # Records a fetch from [host] that took [latency] seconds and ended at
+    # [now] with [status].
+    def record(self, host, status, latency, now):
+        rate = self.hosts.get(host)
+        if rate is None:
+            rate = self.hosts[host] = HostRate(self.min_delay)
+        if host_failed(status):
+            rate.failures += 1
+            rate.delay = self._clamp(rate.delay * 2)
+            if rate.failures >= self.max_failures:
+                # The first fetch after the suspension decides on the next.
+                rate.failures = self.max_failures - 1
+                rate.suspensions += 1
+                if rate.suspensions <= self.max_suspensions:
+                    rate.suspended_until = (
+                        now + self.suspend_time * 2 ** (rate.suspensions - 1))
+            return
+        rate.failures = 0
+        rate.suspensions = 0
+        if rate.latency is None:
+            rate.latency = latency
+        else:
+            rate.latency += self.smoothing * (latency - rate.latency)
+        # Halfway to the target, so one fast response does not undo a backoff.
+        target = self._clamp(self.latency_factor * rate.latency)
+        rate.delay = self._clamp((rate.delay + target) / 2)
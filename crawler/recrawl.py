@@ -0,0 +1,52 @@
+from collections import namedtuple
+from hashlib import blake2b
+
+
+# Incremental re-crawling.
+#
+# With config.incremental set, the frontier keeps a UrlMeta next to the save
+# file entry of every downloaded url: the fingerprint of its content, when it
+# was fetched, and how long to wait before fetching it again. A resumed crawl
+# queues completed urls again once that wait is over. The wait adapts to how
+# often a page changes: it halves, down to min_interval, every time the page
+# is found changed, and doubles, up to max_interval, every time it is not.
+# Pages found unchanged are not parsed again.
+
+UrlMeta = namedtuple(
+    "UrlMeta", ["fingerprint", "fetched", "interval", "fetches", "changes"])
+
+
+# Returns the fingerprint of the content of [resp], or None if there is no
+# content to compare.
+def fingerprint(resp):
+    if resp.status != 200 or resp.raw_response is None:
+        return None
+    return blake2b(resp.raw_response.content, digest_size=16).hexdigest()
+
+
+class RecrawlSchedule(object):
+    def __init__(self, initial_interval=86400, min_interval=3600,
+                 max_interval=30 * 86400):
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+    # Returns the UrlMeta of a url fetched at [now] with content
+    # [fingerprint], given its previous UrlMeta [meta] or None.
+    def update(self, meta, fingerprint, now):
+        if meta is None:
+            return UrlMeta(fingerprint, now, self.initial_interval, 1, 0)
+        if fingerprint is None:
+            # Nothing to compare, e.g. an error: keep the schedule.
+            return meta._replace(fetched=now, fetches=meta.fetches + 1)
+        if fingerprint != meta.fingerprint:
+            return UrlMeta(
+                fingerprint, now, max(self.min_interval, meta.interval / 2),
+                meta.fetches + 1, meta.changes + 1)
+        return meta._replace(
+            fetched=now, interval=min(self.max_interval, meta.interval * 2),
+            fetches=meta.fetches + 1)
+
+    def due(self, meta, now):
+        # Urls completed before metadata was kept are due right away.
+        return meta is None or meta.fetched + meta.interval <= now
@@ -0,0 +1,136 @@
+import os
+import heapq
+import pickle
+import tempfile
+
+
+# Priority queue that can move part of itself to disk.
+#
+# Items live in an in-memory heap until spill() is called. spill() sorts the
+# heap, keeps the better half in memory and writes the worse half to a run
+# file, sorted, in blocks of RUN_BLOCK items. pop() merges the heap with the
+# heads of all run files, so items come out in priority order wherever they
+# are; of each run only the block being read is in memory. A run file is
+# deleted as soon as it is read to the end, and once there are more than
+# MAX_RUNS runs they are merged into one, so open files stay bounded too.
+
+RUN_BLOCK = 1024
+MAX_RUNS = 32
+
+
+class _Run(object):
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.block = iter(())
+
+    def next(self):
+        # Returns the next item of the run, or None at its end.
+        for item in self.block:
+            return item
+        try:
+            self.block = iter(pickle.load(self.file))
+        except EOFError:
+            return None
+        return next(self.block)
+
+    def close(self):
+        self.file.close()
+        os.remove(self.path)
+
+
+def _write_run(items, spill_dir):
+    # Writes the sorted [items] to a new run file in [spill_dir].
+    descriptor, path = tempfile.mkstemp(suffix=".run", dir=spill_dir)
+    with os.fdopen(descriptor, "wb") as file:
+        block = list()
+        for item in items:
+            block.append(item)
+            if len(block) == RUN_BLOCK:
+                pickle.dump(block, file, protocol=pickle.HIGHEST_PROTOCOL)
+                block = list()
+        if block:
+            pickle.dump(block, file, protocol=pickle.HIGHEST_PROTOCOL)
+    return _Run(path)
+
+
+class SpillQueue(object):
+    def __init__(self):
+        self.heap = list()
+        self.heads = list() # Heap of (item, run number): first item of each run.
+        self.runs = dict() # Run number -> _Run.
+        self.run_count = 0
+        self.spilled = 0 # Items in run files, heads included.
+
+    def __len__(self):
+        return len(self.heap) + self.spilled
+
+    def in_memory(self):
+        return len(self.heap)
+
+    def push(self, item):
+        heapq.heappush(self.heap, item)
+
+    def peek(self):
+        if self.heads and (not self.heap or self.heads[0][0] < self.heap[0]):
+            return self.heads[0][0]
+        return self.heap[0]
+
+    def pop(self):
+        if self.heads and (not self.heap or self.heads[0][0] < self.heap[0]):
+            item, number = self.heads[0]
+            run = self.runs[number]
+            following = run.next()
+            if following is None:
+                heapq.heappop(self.heads)
+                run.close()
+                del self.runs[number]
+            else:
+                heapq.heapreplace(self.heads, (following, number))
+            self.spilled -= 1
+            return item
+        return heapq.heappop(self.heap)
+
+    def spill(self, spill_dir):
+        # Moves the worse half of the in-memory items to a run file in
+        # [spill_dir]. Returns the number of items moved.
+        if len(self.heap) < 2:
+            return 0
+        items = sorted(self.heap)
+        keep = len(items) // 2
+        self.heap = items[:keep] # A sorted list is a heap.
+        if len(self.runs) >= MAX_RUNS:
+            self._merge_runs(items[keep:], spill_dir)
+        else:
+            self._add_run(_write_run(items[keep:], spill_dir))
+        self.spilled += len(items) - keep
+        return len(items) - keep
+
+    def _add_run(self, run):
+        number = self.run_count
+        self.run_count += 1
+        self.runs[number] = run
+        heapq.heappush(self.heads, (run.next(), number))
+
+    def _merge_runs(self, items, spill_dir):
+        # Replaces all runs with one run of their items and [items].
+        def read(head, run):
+            while head is not None:
+                yield head
+                head = run.next()
+        merged = _write_run(heapq.merge(
+            items, *(read(head, self.runs[number]) for head, number in self.heads)),
+            spill_dir)
+        for run in self.runs.values():
+            run.close()
+        self.runs.clear()
+        self.heads.clear()
+        self._add_run(merged)
+
+    def close(self):
+        # Deletes the run files.
+        for run in self.runs.values():
+            run.close()
+        self.runs.clear()
+        self.heads.clear()
+        self.spilled = 0
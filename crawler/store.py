@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import shelve
+import sqlite3
+
+from itertools import islice
+from threading import RLock, Thread, Event
+
+
+# Persistent mapping of urlhash -> (url, completed, meta) behind the frontier.
+# meta is None or a tuple of plain values the frontier keeps about a
+# downloaded url (see crawler/recrawl.py); entries may be set without it.
+#
+# Both stores support the operations the frontier needs: `in`, item get and
+# set, len, values(), chunks() and flush()/close(). ShelveStore writes through on every
+# set, exactly like the original frontier did, except while chunks() runs.
+# SqliteStore groups writes into batches and commits a batch once it reaches
+# BATCHSIZE entries or is older than BATCHINTERVAL seconds, also when no
+# further write comes.
+#
+# A batch is committed as one transaction and writes keep their order, so a
+# crash can only lose the newest writes. Since a worker adds the links of a
+# page before marking that page complete, losing a suffix of writes at worst
+# means some pages are downloaded again and their links rediscovered.
+
+
+class ShelveStore(object):
+    def __init__(self, path):
+        self.path = path
+        self.shelf = shelve.open(path)
+        # While chunks() walks the keys, writes wait here, since a dbm may
+        # reorder its keys on a write.
+        self.pending = dict()
+        self.reading = False
+
+    def __contains__(self, urlhash):
+        return urlhash in self.pending or urlhash in self.shelf
+
+    def __getitem__(self, urlhash):
+        if urlhash in self.pending:
+            return _full_entry(self.pending[urlhash])
+        return _full_entry(self.shelf[urlhash])
+
+    def __setitem__(self, urlhash, entry):
+        if self.reading:
+            self.pending[urlhash] = entry
+            return
+        self.shelf[urlhash] = entry
+        self.shelf.sync()
+
+    def __len__(self):
+        return len(self.shelf) + sum(
+            1 for urlhash in self.pending if urlhash not in self.shelf)
+
+    def values(self):
+        # (url, completed) of every entry.
+        self.flush()
+        return (entry[:2] for entry in self.shelf.values())
+
+    def _keys(self):
+        # Walks the keys one at a time where the dbm can, as dbm.gnu does;
+        # the others build the list of keys in keys() anyway.
+        db = self.shelf.dict
+        if hasattr(db, "firstkey"):
+            key = db.firstkey()
+            while key is not None:
+                yield key.decode(self.shelf.keyencoding)
+                key = db.nextkey(key)
+        else:
+            yield from self.shelf.keys()
+
+    def chunks(self, chunk_size):
+        # Generator of lists of (urlhash, url, completed, meta) of the
+        # entries there were when it started. Writes made until it is done
+        # are kept in memory and written after the last chunk.
+        self.flush()
+        self.reading = True
+        try:
+            keys = self._keys()
+            while True:
+                chunk = [
+                    (urlhash, *_full_entry(self.shelf[urlhash]))
+                    for urlhash in islice(keys, chunk_size)]
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            # Not after close(), which already wrote them.
+            if self.reading:
+                self.reading = False
+                self.flush()
+
+    def flush(self):
+        if self.reading:
+            return
+        for urlhash, entry in self.pending.items():
+            self.shelf[urlhash] = entry
+        self.pending.clear()
+        self.shelf.sync()
+
+    def close(self):
+        self.reading = False
+        self.flush()
+        self.shelf.close()
+
+
+class SqliteStore(object):
+    def __init__(self, path, batch_size=1000, batch_interval=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.lock = RLock()
+        self.pending = dict() # urlhash -> entry not yet committed.
+        self.last_commit = time.time()
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only risks the last transactions on power loss,
+        # never the consistency of the file.
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            "urlhash TEXT PRIMARY KEY, url TEXT NOT NULL, "
+            "completed INTEGER NOT NULL, meta TEXT)")
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(urls)")]
+        if "meta" not in columns:
+            # Save file from before meta was kept.
+            self.db.execute("ALTER TABLE urls ADD COLUMN meta TEXT")
+        self.db.commit()
+
+        self.closed = Event()
+        self.committer = None
+        if batch_interval > 0:
+            self.committer = Thread(target=self._commit_loop, daemon=True)
+            self.committer.start()
+
+    def _commit_loop(self):
+        # Commits a batch that got no write for BATCHINTERVAL, so an idle
+        # crawl does not keep it uncommitted until close().
+        while not self.closed.wait(self.batch_interval):
+            with self.lock:
+                if (self.pending and time.time() - self.last_commit
+                        >= self.batch_interval):
+                    self.flush()
+
+    def __contains__(self, urlhash):
+        with self.lock:
+            if urlhash in self.pending:
+                return True
+            return self.db.execute(
+                "SELECT 1 FROM urls WHERE urlhash = ?",
+                (urlhash,)).fetchone() is not None
+
+    def __getitem__(self, urlhash):
+        with self.lock:
+            if urlhash in self.pending:
+                return _full_entry(self.pending[urlhash])
+            row = self.db.execute(
+                "SELECT url, completed, meta FROM urls WHERE urlhash = ?",
+                (urlhash,)).fetchone()
+        if row is None:
+            raise KeyError(urlhash)
+        return row[0], bool(row[1]), _load_meta(row[2])
+
+    def __setitem__(self, urlhash, entry):
+        with self.lock:
+            self.pending[urlhash] = entry
+            if (len(self.pending) >= self.batch_size
+                    or time.time() - self.last_commit >= self.batch_interval):
+                self.flush()
+
+    def __len__(self):
+        with self.lock:
+            self.flush()
+            return self.db.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def values(self):
+        with self.lock:
+            self.flush()
+            rows = self.db.execute("SELECT url, completed FROM urls").fetchall()
+        return [(url, bool(completed)) for url, completed in rows]
+
+    def chunks(self, chunk_size):
+        # Generator of lists of (urlhash, url, completed, meta). Reads go
+        # through their own connection, which sees a snapshot of the
+        # database and does not block commits of new batches.
+        self.flush()
+        reader = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            cursor = reader.execute(
+                "SELECT urlhash, url, completed, meta FROM urls")
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [
+                    (urlhash, url, bool(completed), _load_meta(meta))
+                    for urlhash, url, completed, meta in rows]
+        finally:
+            reader.close()
+
+    def flush(self):
+        with self.lock:
+            if self.pending:
+                rows = list()
+                for urlhash, entry in self.pending.items():
+                    url, completed, meta = _full_entry(entry)
+                    rows.append((urlhash, url, int(completed), _dump_meta(meta)))
+                with self.db:
+                    self.db.executemany(
+                        "INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?)", rows)
+                self.pending.clear()
+            self.last_commit = time.time()
+
+    def close(self):
+        self.closed.set()
+        if self.committer is not None:
+            self.committer.join()
+        with self.lock:
+            self.flush()
+            self.db.close()
+
+
+def _full_entry(entry):
+    # Entries set without meta, or saved before meta was kept, have None.
+    return entry if len(entry) == 3 else (entry[0], entry[1], None)
+
+
+def _dump_meta(meta):
+    return None if meta is None else json.dumps(meta)
+
+
+def _load_meta(meta):
+    return None if meta is None else tuple(json.loads(meta))
+
+
+# Files sqlite keeps next to the database while it is open.
+SQLITE_SUFFIXES = ("-wal", "-shm")
+
+
+def open_store(config):
+    if config.store == "sqlite":
+        return SqliteStore(
+            config.save_file, config.batch_size, config.batch_interval)
+    elif config.store == "shelve":
+        return ShelveStore(config.save_file)
+    raise ValueError(
+        f"Unknown STORE {config.store}, expected shelve or sqlite.")
+
+
+def remove_store(path):
+    os.remove(path)
+    for suffix in SQLITE_SUFFIXES:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
@@ -1,55 +1,81 @@
+import time
+
 from threading import Thread
 
 from inspect import getsource
 from utils.download import download
 from utils import get_logger
+from crawler import recrawl
 import scraper
-import time
-import custom_logger
+
+_scraper_checked = False
+
+
+def check_scraper():
+    # basic check for requests in scraper, once per process since reading
+    # the source is slow.
+    global _scraper_checked
+    if not _scraper_checked:
+        assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {-1}, "Do not use requests from scraper.py"
+        _scraper_checked = True
 
 
 class Worker(Thread):
-    def __init__(self, worker_id, config, frontier):
+    def __init__(self, worker_id, config, frontier, pipeline=None):
         self.logger = get_logger(f"Worker-{worker_id}", "Worker")
         self.config = config
         self.frontier = frontier
-        # basic check for requests in scraper
-        assert {getsource(scraper).find(req) for req in {"from requests import", "import requests"}} == {-1}, "Do not use requests from scraper.py"
+        # When set, pages are parsed by the ParsePipeline instead of inline.
+        self.pipeline = pipeline
+        check_scraper()
         super().__init__(daemon=True)
         
     def run(self):
         while True:
             tbd_url = self.frontier.get_tbd_url()
             if not tbd_url:
+                if self.pipeline and self.pipeline.drain():
+                    # Pages still being parsed may have added urls.
+                    continue
                 self.logger.info("Frontier is empty. Stopping Crawler.")
                 break
-            resp = download(tbd_url, self.config, self.logger)
-            self.logger.info(
-                f"Downloaded {tbd_url}, status <{resp.status}>, "
-                f"using cache {self.config.cache_server}.")
-            scraped_urls = scraper.scraper(tbd_url, resp)
-            for scraped_url in scraped_urls:
-                self.frontier.add_url(scraped_url)
-            self.frontier.mark_url_complete(tbd_url)
-            time.sleep(self.config.time_delay)
-
-        # Log results
-        results_logger = custom_logger.get_logger("results")
-
-        # Log number of unique urls
-        results_logger.info(f"{len(scraper.sites_seen)} unique urls")
-
-        # Log number of unique page downloads
-        results_logger.info(f"{len(scraper.site_hashes)} unique downloads")
-
-        # Log longest page
-        results_logger.info(f"{scraper.longest_page_url} is the longest page with {scraper.highest_word_count} words")
-
-        # Log all ics subdomains
-        results_logger.info(f"Found {len(scraper.ics_sites)} ics subdomains.")
-        for subdomain, pages in sorted(scraper.ics_sites.items()):
-            results_logger.info(f"{subdomain}:{pages}")
-
-        # Log word freqs list
-        for word, freq in sorted(scraper.word_freqs.items(), key=lambda x: x[1], reverse=True):
-            results_logger.info(f"{word}:{freq}")
+            try:
+                start = time.perf_counter()
+                resp = download(
+                    tbd_url, self.config, self.logger, self.refresh(tbd_url))
+                self.frontier.record_response(
+                    tbd_url, resp.status, time.perf_counter() - start)
+                self.logger.info(
+                    f"Downloaded {tbd_url}, status <{resp.status}>, "
+                    f"using cache {self.config.cache_server}.")
+                self.scrape(tbd_url, resp)
+            except Exception as e:
+                # Completed anyway, or the other workers would wait for its
+                # links forever.
+                self.logger.error(f"Failed to crawl {tbd_url}: {e!r}")
+                self.frontier.mark_url_complete(tbd_url)
+
+    def refresh(self, tbd_url):
+        # True for a url downloaded again in incremental mode, which must not
+        # be answered from the response store: the stored response is the
+        # one it is compared with.
+        return self.config.incremental and self.frontier.was_completed(tbd_url)
+
+    def scrape(self, tbd_url, resp):
+        recrawled = False
+        if self.config.incremental:
+            recrawled = self.frontier.was_completed(tbd_url)
+            if not self.frontier.record_fetch(tbd_url, recrawl.fingerprint(resp)):
+                # Downloaded again, but nothing changed.
+                self.logger.info(f"{tbd_url} is unchanged, not parsing it again.")
+                self.frontier.mark_url_complete(tbd_url)
+                return
+        if self.pipeline:
+            self.pipeline.submit(tbd_url, resp, recrawled)
+            return
+        scraped_urls, word_count = scraper.scrape_page(tbd_url, resp, recrawled)
+        for scraped_url in scraped_urls:
+            self.frontier.add_url(
+                scraped_url, parent=tbd_url, parent_words=word_count)
+        self.frontier.mark_url_complete(tbd_url)
+
@@ -1,6 +1,8 @@
 import os
 import logging
 
+from utils import queued
+
 
 # Modification of the get_logger function that returns a logger that does
 #  not print to the screen.
@@ -15,5 +17,5 @@ def get_logger(name, filename=None):
        "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
     fh.setFormatter(formatter)
     # add the handlers to the logger
-    logger.addHandler(fh)
+    logger.addHandler(queued(fh))
     return logger
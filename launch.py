@@ -1,17 +1,42 @@
+import signal
+
 from configparser import ConfigParser
 from argparse import ArgumentParser
 
 from utils.server_registration import get_cache_server
 from utils.config import Config
 from crawler import Crawler
+from crawler.frontier import Frontier
+from crawler.worker import Worker
 
 
-def main(config_file, restart):
+def main(config_file, restart, node_id=None):
     cparser = ConfigParser()
     cparser.read(config_file)
     config = Config(cparser)
-    config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
+    frontier_factory = Frontier
+    if config.cluster_nodes:
+        # Every node keeps its own save file.
+        if node_id is not None:
+            config.node_id = node_id
+        config.save_file = f"{config.save_file}.node{config.node_id}"
+        from crawler.cluster import DistributedFrontier
+        frontier_factory = DistributedFrontier
+    if config.cache_server is None:
+        config.cache_server = get_cache_server(config, restart)
+    worker_factory = Worker
+    if config.async_download:
+        from crawler.async_worker import AsyncWorker
+        worker_factory = AsyncWorker
+    crawler = Crawler(
+        config, restart, frontier_factory=frontier_factory,
+        worker_factory=worker_factory)
+
+    def stop(signum, frame):
+        # A second Ctrl-C stops right away, without a checkpoint.
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        crawler.stop()
+    signal.signal(signal.SIGINT, stop)
     crawler.start()
 
 
@@ -19,5 +44,6 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--restart", action="store_true", default=False)
     parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--node_id", type=int, default=None)
     args = parser.parse_args()
-    main(args.config_file, args.restart)
+    main(args.config_file, args.restart, args.node_id)
@@ -0,0 +1,53 @@
+import time
+
+from configparser import ConfigParser
+from argparse import ArgumentParser
+
+from utils import get_logger
+from utils.config import Config
+from utils.response_store import ResponseStore
+import scraper
+
+
+# Runs scraper.scraper over every response in a local response store, with no
+# cache server and no frontier, and writes the report like a crawl does. Use
+# it to check a fix of the scraper against a crawl that was stored with
+# [RESPONSECACHE] DIRECTORY set.
+
+
+def main(config_file, directory):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    directory = directory or config.response_cache
+    if not directory:
+        raise ValueError(
+            "No response store, set [RESPONSECACHE] DIRECTORY or --store.")
+    # The state of a replay is not saved, so it cannot mix with a crawl's.
+    config.snapshot_interval = 0
+    logger = get_logger("REPLAY")
+    scraper.init_state(config, True)
+    store = ResponseStore(directory, config.segment_size, config.compress_level)
+    start = time.perf_counter()
+    pages = links = 0
+    try:
+        for url, resp in store.responses():
+            links += len(scraper.scraper(url, resp))
+            pages += 1
+    finally:
+        store.close()
+    if scraper.exporter is not None:
+        scraper.exporter.flush()
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Replayed {pages} pages with {links} new links in {elapsed:.2f}s, "
+        f"{pages / max(elapsed, 1e-9):.1f} pages/sec.")
+    scraper.log_results(config)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--store", type=str, default=None)
+    args = parser.parse_args()
+    main(args.config_file, args.store)
@@ -1,11 +1,19 @@
+import os
 import re
-import hashlib
 import tokenizer
-from collections import defaultdict
+from collections import namedtuple
+from threading import Thread, Event
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
 
 from custom_logger import get_logger
+from utils.dedup import make_dedup_set, load_dedup_set
+from utils.export import CrawlExporter
+from utils.extract import extract
+from utils.metrics import metrics
+from utils.near_duplicate import SimhashIndex, simhash
+from utils.stats import CrawlStats
+from utils.traps import TrapDetector
+from utils.url_filter import UrlFilter, BLACKLIST
 
 
 '''
@@ -23,13 +31,8 @@ TODO
 '''
 
 
-VALID_DOMAIN_PATTERN = re.compile(".*((\.ics\.uci\.edu\/)|(\.cs\.uci\.edu\/)|(\.informatics\.uci\.edu\/)|(\.stat\.uci\.edu\/)|(today\.uci\.edu\/department\/information_computer_sciences\/)).*")
-VALID_DOMAIN_PATTERN2 = re.compile(".*((\.ics\.uci\.edu)|(\.cs\.uci\.edu)|(\.informatics\.uci\.edu)|(\.stat\.uci\.edu)|(today\.uci\.edu\/department\/information_computer_sciences)).*")
 ICS_PATTERN = re.compile("ics.uci.edu")
-BLACKLIST_PATTERN = re.compile(
-    r"login|intranet|tippersweb|wics-meeting-dbh|wics.ics.uci.edu/events/|action=download|" +
-    r"share=facebook|share=twitter|pdf|\.java|\.py|\.scm|\.r|\.m|\.bib|\.pptx|\.ppsx|ical=1"
-)
+URL_FILTER = UrlFilter()
 
 stop_words = {"a", "about", "above", "after","again", "against", "all", "am", "an", "and", "any",\
     "are", "aren't", "as", "at","be","because","been","before","being","below","between","both","but","by",\
@@ -45,34 +48,204 @@ stop_words = {"a", "about", "above", "after","again", "against", "all", "am", "a
     "which","while","who","who's","whom","why","why's","with","won't","would","wouldn't","you","you'd","you'll","you're",\
     "you've","your","yours","yourself","yourselves"}
 
-sites_seen = set() # Sites that were added to the frontier.
-ics_sites = defaultdict(int) # Sites seen that are ics sites.
-site_hashes = set() # Hashes for sites that have been downloaded.
+# What parse_page extracts from the content of a page.
+ParsedPage = namedtuple("ParsedPage", ["word_counts", "links", "fingerprint"])
 
-word_freqs = defaultdict(int) # For all downloaded pages.
+sites_seen = make_dedup_set(1 << 16, 1e-6) # Sites that were added to the frontier.
+site_hashes = make_dedup_set(1 << 16, 1e-6) # Contents of sites that have been downloaded.
+near_duplicates = SimhashIndex() # Fingerprints of the words of downloaded sites.
+similarity_min_words = 20 # Shorter pages are not checked for near duplicates.
 
-highest_word_count = -1 # Used to store the longest page.
-longest_page_url = ''
+traps = TrapDetector() # Crawl budgets per host and per path template.
+
+# Word frequencies, ics sites seen, and the longest page, sharded per thread.
+stats = CrawlStats()
+
+# Writes pages, links and word counts to column files, if config.export_dir.
+exporter = None
+
+stop_checkpoints = Event() # Stops the checkpoints started by init_state.
+
+owns = None # Set by a node of a cluster: whether a url is in its partition.
+remote_reports = list() # Reports of the other nodes, added to the results.
 
 blacklist_logger = get_logger("blacklist") # Logger that logs urls that are not valid
 duplicate_logger = get_logger("duplicate") # Logger that logs pages with duplicate content.
+near_duplicate_logger = get_logger("near_duplicate") # Logger that logs pages with nearly duplicate content.
 longest_page_logger = get_logger("longest_page") # Logger that logs when the longest page has been found.
 little_words_logger = get_logger("little_words") # Logger that logs pages with too little words.
-# trap_logger = get_logger("trap")
+trap_logger = get_logger("trap") # Logger that logs urls that look like crawler traps.
+
+
+def init_state(config, restart):
+    # Sizes the dedup sets from the config, and loads them from the last
+    # crawl unless restarting.
+    global sites_seen, site_hashes, near_duplicates, similarity_min_words
+    global traps, stats, exporter, stop_checkpoints, owns, remote_reports
+    sites_seen = make_dedup_set(
+        config.expected_urls, config.dedup_fp_rate, config.dedup_bloom)
+    site_hashes = make_dedup_set(
+        config.expected_urls, config.dedup_fp_rate, config.dedup_bloom)
+    near_duplicates = SimhashIndex(config.similarity)
+    similarity_min_words = config.similarity_min_words
+    traps = TrapDetector(
+        config.host_budget, config.template_budget, config.max_repeats,
+        config.sketch_width, config.sketch_depth)
+    stats = CrawlStats(config.top_capacity)
+    exporter = None
+    owns = None
+    remote_reports = list()
+    if config.export_dir:
+        exporter = CrawlExporter(config.export_dir, config.export_batch, restart)
+    if not restart:
+        if os.path.exists(f"{config.save_file}.seen"):
+            sites_seen = load_dedup_set(f"{config.save_file}.seen")
+        if os.path.exists(f"{config.save_file}.hashes"):
+            site_hashes = load_dedup_set(f"{config.save_file}.hashes")
+        if os.path.exists(f"{config.save_file}.simhash"):
+            near_duplicates = SimhashIndex.load(
+                f"{config.save_file}.simhash", config.similarity)
+        if os.path.exists(f"{config.save_file}.traps"):
+            traps.load(f"{config.save_file}.traps")
+        if os.path.exists(f"{config.save_file}.stats"):
+            stats.load(f"{config.save_file}.stats")
+    stop_checkpoints = Event()
+    if config.snapshot_interval > 0:
+        Thread(target=_checkpoint_loop, args=(config,), daemon=True).start()
+
+
+def _checkpoint_loop(config):
+    while not stop_checkpoints.wait(config.snapshot_interval):
+        checkpoint(config)
+
+
+def checkpoint(config):
+    # Saves the state of this module next to the save file while workers
+    # keep crawling. The statistics are taken first: a page in them was
+    # added to the dedup sets before, so it is in the sets saved after them
+    # too, and a resumed crawl that downloads it again skips it instead of
+    # counting it twice. Files are written under temporary names and the
+    # statistics renamed last, so a crash while saving leaves older
+    # statistics, which the newer sets cover as well.
+    saved = [
+        (stats, f"{config.save_file}.stats"),
+        (sites_seen, f"{config.save_file}.seen"),
+        (site_hashes, f"{config.save_file}.hashes"),
+        (near_duplicates, f"{config.save_file}.simhash"),
+        (traps, f"{config.save_file}.traps")]
+    for state, path in saved:
+        state.save(f"{path}.tmp")
+    for _, path in reversed(saved):
+        os.replace(f"{path}.tmp", path)
+
+
+def save_state(config):
+    stop_checkpoints.set()
+    checkpoint(config)
+    if exporter is not None:
+        exporter.flush()
+
+
+def report():
+    # What a node of a cluster sends the first node at the end of the crawl.
+    # Every url is seen by the node that owns it only, so the counts add up.
+    return {"stats": stats.snapshot(), "urls": len(sites_seen),
+            "downloads": len(site_hashes)}
+
+
+def log_results(config):
+    # Writes the report once, for all workers, and for all nodes of a
+    # cluster on the first one.
+    results_logger = get_logger("results")
+    merged = stats.merged(report["stats"] for report in remote_reports)
+    urls = len(sites_seen) + sum(report["urls"] for report in remote_reports)
+    downloads = len(site_hashes) + sum(
+        report["downloads"] for report in remote_reports)
+
+    # Log number of unique urls
+    results_logger.info(f"{urls} unique urls")
+
+    # Log number of unique page downloads
+    results_logger.info(f"{downloads} unique downloads")
+
+    # Log longest page
+    results_logger.info(f"{merged.longest_page_url} is the longest page with {merged.highest_word_count} words")
+
+    # Log all ics subdomains
+    results_logger.info(f"Found {len(merged.ics_sites)} ics subdomains.")
+    for subdomain, pages in sorted(merged.ics_sites.items()):
+        results_logger.info(f"{subdomain}:{pages}")
+
+    # Log most common words
+    for word, freq in merged.words.most_common(config.top_words):
+        results_logger.info(f"{word}:{freq}")
 
 
 def scraper(url, resp):
-    links = [link for link in extract_next_links(url, resp) if is_valid(link)]
-
-    for link in links:
-        sites_seen.add(link)
-
-        # Check for ics sub domains
-        domain = urlparse(link).hostname
-        if ICS_PATTERN.search(domain) != None:
-            ics_sites[domain] += 1
-
-    return links
+    return filter_links(extract_next_links(url, resp))
+
+
+# Like scraper, but also returns the number of words on the page, which the
+# frontier uses to prioritize its links. 0 if the page was not parsed.
+def scrape_page(url, resp, recrawled=False):
+    if not should_parse(url, resp):
+        return [], 0
+    page = parse_page(resp.raw_response.content, page_url(url, resp))
+    return filter_links(merge_page(url, page, recrawled)), page_word_count(page)
+
+
+def filter_links(links):
+    with metrics.time("filter"):
+        unseen = [link for link in links if link and link not in sites_seen]
+        links_seen = len(links) - len(unseen)
+        links = URL_FILTER.filter(unseen, _log_rejected)
+        metrics.inc("links_total", len(unseen) - len(links), result="invalid")
+
+        admitted = list()
+        forwarded = 0
+        for link in links:
+            if owns is not None and not owns(link):
+                # Another node of the cluster owns the link, and sees it and
+                # counts it against the budgets in admit_forwarded.
+                forwarded += 1
+                admitted.append(link)
+                continue
+            if not sites_seen.add(link):
+                links_seen += 1
+                continue # Duplicate within this page.
+            if admit(link):
+                admitted.append(link)
+
+        metrics.inc("links_total", links_seen, result="seen")
+        metrics.inc("links_total", forwarded, result="forwarded")
+        metrics.inc("links_total", len(admitted) - forwarded, result="admitted")
+        return admitted
+
+
+def admit(link):
+    # Counts a new link against the crawl budgets. False if it is a trap.
+    reason = traps.admit(link)
+    if reason is not None:
+        metrics.inc("links_total", result="trap")
+        trap_logger.info(f"{link} is a trap: {reason}.")
+        return False
+
+    # Check for ics sub domains
+    domain = urlparse(link).hostname
+    if ICS_PATTERN.search(domain) != None:
+        stats.add_ics_site(domain)
+    return True
+
+
+def admit_forwarded(link):
+    # filter_links for a link another node of the cluster found for this one.
+    if not sites_seen.add(link):
+        metrics.inc("links_total", result="seen")
+        return False
+    if not admit(link):
+        return False
+    metrics.inc("links_total", result="admitted")
+    return True
 
 
 def extract_next_links(url, resp):
@@ -86,89 +259,110 @@ def extract_next_links(url, resp):
     #         resp.raw_response.content: the content of the page!
     # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
 
-    if (resp.status != 200):
+    if not should_parse(url, resp):
         return []
 
-    site_hash = hashlib.sha256(resp.raw_response.content).hexdigest()
+    return merge_page(url, parse_page(resp.raw_response.content, page_url(url, resp)))
+
 
-    if (site_hash in site_hashes):
+# Extraction is split in three steps so the parsing can run in another
+# process (see crawler/pipeline.py): should_parse and merge_page read and
+# update the state of this module, parse_page only looks at the content.
+
+def should_parse(url, resp):
+    if (resp.status != 200):
+        return False
+
+    if not site_hashes.add(resp.raw_response.content): # Add content hash to set.
+        metrics.inc("pages_total", result="duplicate")
         duplicate_logger.info(f"{url} has duplicate content.")
-        return []
+        return False
 
-    else:
-        site_hashes.add(site_hash) # Add content hash to set.
+    return True
 
-        soup = BeautifulSoup(resp.raw_response.content, "lxml") # Parse html content.
 
-        # Tokenize words in page text, keeping count and updating frequencies.
-        word_count = 0
+# Url the links of a page are relative to: the url the page was finally
+# downloaded from after redirects, if known.
+def page_url(url, resp):
+    return getattr(resp.raw_response, "url", None) or resp.url or url
 
-        for word in tokenizer._tokenize_string(soup.get_text()):
-            word_count += 1
-            if not word in stop_words:
-                word_freqs[word] += 1
 
-        # See if page is longer then the current longest page.
-        global longest_page_url
-        global highest_word_count
+def parse_page(content, base_url=None):
+    # Text and links in one pass, links resolved against base_url or the
+    # <base> of the page and in canonical form.
+    with metrics.time("parse"):
+        text, links = extract(content, base_url)
 
-        if word_count > highest_word_count:
-            longest_page_logger.info(f"{url} is now the longest page with {word_count} words.")
-            longest_page_url = url
-            highest_word_count = word_count
-
-        # Return links (fragments stripped) for page only if it has more than 100 words.
-        if word_count >= 100:
-            return [strip_fragment(link.get("href")) for link in soup.find_all("a")]
-        else:
-            little_words_logger.info(f"{url} only has {word_count} words")
+    # Tokenize words in page text, keeping count.
+    with metrics.time("tokenize"):
+        word_counts = tokenizer.count_tokens(text)
+
+    return ParsedPage(word_counts, links, simhash(word_counts))
+
+
+def page_word_count(page):
+    return sum(page.word_counts.values())
+
+
+# [recrawled] is set for a page downloaded again in incremental mode because
+# it changed. Its old version is already in the statistics and the near
+# duplicate index, so it is neither counted again nor compared with itself.
+def merge_page(url, page, recrawled=False):
+    word_count = page_word_count(page)
+    words = {word: count for word, count in page.word_counts.items() if not word in stop_words}
+
+    if recrawled:
+        metrics.inc("pages_total", result="changed")
+    else:
+        # Skip pages that are nearly the same as a page seen before. Short
+        # pages have too few words for a meaningful fingerprint: all empty
+        # pages have the same one.
+        if (word_count >= similarity_min_words
+                and not near_duplicates.add(page.fingerprint)):
+            metrics.inc("pages_total", result="near_duplicate")
+            near_duplicate_logger.info(f"{url} has nearly duplicate content.")
             return []
+        metrics.inc("pages_total", result="unique")
+
+        # Update frequencies, and see if page is longer then the current longest page.
+        if stats.add_page(url, word_count, words):
+            longest_page_logger.info(f"{url} is now the longest page with {word_count} words.")
+    if exporter is not None:
+        exporter.add_page(url, word_count, page.fingerprint, words, page.links)
+
+    # Return links for page only if it has more than 100 words.
+    if word_count >= 100:
+        return page.links
+    else:
+        little_words_logger.info(f"{url} only has {word_count} words")
+        return []
 
 
 def is_valid(url):
     # Decide whether to crawl this url or not. 
     # If you decide to crawl it, return True; otherwise return False.
-    # There are already some conditions that return False.
-    try:
-        parsed = urlparse(url)
-        domain = str(parsed.hostname)
-
-        # if parsed.hostname == None:
-        #     return False
-        # parsed.path.split("/")
-        # base_url = parsed.scheme + "://" + parsed.hostname + "/".join(parsed.path.split("/")[:6])
-        # parsed.scheme + "://" + parsed.hostname + "/".join(parsed.path.split("/")[:6])
-
-        if url in sites_seen:
-            return False
-        elif parsed.scheme not in set(["http", "https"]):
-            return False
-        elif VALID_DOMAIN_PATTERN.fullmatch(domain) == None and VALID_DOMAIN_PATTERN2.fullmatch(domain) == None:
-            return False
-        elif BLACKLIST_PATTERN.search(url) != None:
-            blacklist_logger.info(f"{url} is in the blacklist.")
-            return False
-        # elif base_url in sites_seen and len(parsed.path.split("/")) >= 7: # Doesnt work right now
-        #     trap_logger.info(f"{url} is a trap")
-        #     return False
-
-        return not re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
-
-    except TypeError:
-        print ("TypeError for ", parsed)
-        raise
-
-
-def strip_fragment(url):
-    if url != None:
-        return url.split("#")[0]
-    else:
-        return url
+    # The static rules live in utils/url_filter.py.
+    if not url or url in sites_seen:
+        return False
+    return is_allowed(url)
+
+
+# The rules of is_valid without the seen check, for urls already in the
+# frontier's save file, which were all seen when they were added.
+def is_allowed(url):
+    reason = URL_FILTER.check(url)
+    if reason is not None:
+        _log_rejected(url, reason)
+        return False
+
+    # Budgets are counted when links are found, see filter_links.
+    reason = traps.check_path(url)
+    if reason is not None:
+        trap_logger.info(f"{url} is a trap: {reason}.")
+        return False
+    return True
+
+
+def _log_rejected(url, reason):
+    if reason == BLACKLIST:
+        blacklist_logger.info(f"{url} is in the blacklist.")
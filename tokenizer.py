@@ -1,10 +1,28 @@
+import re
 import sys
+from argparse import ArgumentParser
+from collections import Counter
+from multiprocessing import Pool
+
+
+# Matches runs of alphanumeric characters. For str patterns \w is exactly the
+# characters for which str.isalnum() is True plus the underscore, so this
+# splits text the same way a character by character isalnum() scan does.
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# Byte translation table mapping every ascii byte that is not alphanumeric to a
+# space. Pure ascii text is split with it, which is faster than the regex.
+ASCII_SEPARATORS = bytes(
+    byte if chr(byte).isalnum() else ord(' ') for byte in range(256))
+
+# The ascii characters that are part of tokens.
+ASCII_ALNUM = ''.join(chr(byte) for byte in range(128) if chr(byte).isalnum())
 
 
 # Runs in linear time in relation to the the length of the text file as it
 # iterates through every line and every character in the file.
-# _tokenize_string() is linear in time complexity and every iteration does a 
-# constant amount of work, as append() is a constant operation.
+# _tokenize_string() is linear in time complexity and extend() is linear in
+# the number of tokens of the line.
 #
 # Returns list containing the tokens from file at [path].
 def tokenize(path):
@@ -12,12 +30,75 @@ def tokenize(path):
 
     with open(path, 'r', encoding='ascii', errors='replace') as file:
         for line in file:
-            for token in _tokenize_string(line):
-                tokens.append(token)
+            tokens.extend(_tokenize_string(line))
 
     return tokens
 
 
+# Runs in linear time in relation to the length of the text file, same as
+# tokenize(), but never builds the list of all tokens. Memory is bounded by
+# [buffer_size] and the number of distinct tokens, not by the size of the
+# file: it is read [buffer_size] characters at a time, and the alphanumeric
+# run at the end of a buffer is carried over to the next one, so tokens that
+# cross buffer boundaries are counted whole. The file is read as ascii, so
+# tokens are runs of ascii letters and digits and lowercasing them one piece
+# at a time is exact. Tokens longer than [buffer_size] characters are skipped,
+# which keeps the carried over text bounded.
+#
+# Returns a Counter with the frequency of every token in the file at [path].
+def count_file_tokens(path, buffer_size=1 << 20):
+    counter = Counter()
+    carry = ''
+    skipping = False # Inside a token longer than buffer_size.
+
+    with open(path, 'r', encoding='ascii', errors='replace') as file:
+        while True:
+            buffer = file.read(buffer_size)
+            if not buffer:
+                break
+            if skipping:
+                buffer = buffer.lstrip(ASCII_ALNUM)
+                if not buffer:
+                    continue
+                skipping = False
+            text = carry + buffer
+            if carry:
+                # The token carried over may turn out to be too long.
+                first = len(text) - len(text.lstrip(ASCII_ALNUM))
+                if first > buffer_size:
+                    text = text[first:]
+                    skipping = not text
+            end = len(text.rstrip(ASCII_ALNUM))
+            count_tokens(text[:end], counter)
+            carry = text[end:]
+            if len(carry) > buffer_size:
+                carry = ''
+                skipping = True
+
+    count_tokens(carry, counter) # For last token.
+    return counter
+
+
+# Runs in linear time in relation to the total length of the files. Files are
+# counted in parallel by [jobs] processes and their counters merged.
+#
+# Returns a Counter with the frequency of every token in the files at [paths].
+def count_files_tokens(paths, jobs=1, buffer_size=1 << 20):
+    counter = Counter()
+
+    if jobs <= 1 or len(paths) <= 1:
+        for path in paths:
+            counter.update(count_file_tokens(path, buffer_size))
+        return counter
+
+    with Pool(min(jobs, len(paths))) as pool:
+        for file_counter in pool.starmap(
+                count_file_tokens, [(path, buffer_size) for path in paths]):
+            counter.update(file_counter)
+
+    return counter
+
+
 # Runs in linear time in relation to the size of the tokens list as it iterates
 # through every token and each iteration only does a constant amount of work
 # with both dictionary retreival and insertion being a constant operation.
@@ -45,46 +126,77 @@ def print_token_freqs(token_freq):
         print(f'{token} = {freq}')
 
 
+# Runs in O(nlogk) time in relation to the size of token_freq and [k], as
+# most_common(k) keeps a heap of the k largest frequencies instead of sorting
+# every token.
+#
+# Print the [k] most frequent tokens and their frequencies into standard out,
+# in descending order.
+def print_top_token_freqs(token_freq, k):
+    for token, freq in Counter(token_freq).most_common(k):
+        print(f'{token} = {freq}')
+
+
 # Helper function runs in linear time in relation to the length of the string.
-# It iterates through every character with lower() and with the for loop. The
-# operations isalnum(), append(), len, etc are constant operations. Some
-# iterations will run join(), however, summing over all iterations, it will
-# perform at most N extra operations.
+# lower() and the split each pass over the string once, in C, instead of
+# looping over it one python character at a time. Ascii text is split by
+# translating separators to spaces at the byte level, other text by the
+# precompiled TOKEN_PATTERN.
 #
-# Generator function that yields the tokens from [string].
+# Returns a list of the tokens from [string]. The whole string is lowercased
+# before it is split, which matters for the few characters whose lowercase
+# form is longer than one character.
 def _tokenize_string(string):
-    token_chars = []
+    string = string.lower()
+    if string.isascii():
+        return string.encode('ascii').translate(ASCII_SEPARATORS).decode('ascii').split()
+    return TOKEN_PATTERN.findall(string)
 
-    for char in string.lower():
-        if char.isalnum():
-            token_chars.append(char)
-        else:
-            if len(token_chars) != 0: yield ''.join(token_chars)
-            token_chars = []
 
-    if len(token_chars) != 0: yield ''.join(token_chars) # For last token.
+# Runs in linear time in relation to the length of the string. Counter.update()
+# counts the tokens in C.
+#
+# Adds the frequency of every token in [string] to [counter], or to a new
+# Counter if none is given, and returns it.
+def count_tokens(string, counter=None):
+    if counter is None:
+        counter = Counter()
+    counter.update(_tokenize_string(string))
+    return counter
 
 
 # Program has a runtime complexity of O(nlogn) in relation to the size of the
 # file. Sorting is the operation with the highest runtime complexity in the
-# program and in the worst case, every other character is a token.
+# program and in the worst case, every other character is a token. With --top,
+# sorting is replaced by a heap of k tokens and the program is linear.
 #
 # Program logic.
 def _program(args):
-    if len(args) != 1:
-        print(f'Invalid number of arguments. Expected 1, received {len(args)}.')
-        return
+    parser = ArgumentParser(prog='tokenizer.py')
+    parser.add_argument('paths', nargs='+', metavar='path')
+    parser.add_argument('--top', type=int, default=None,
+                        help='only print the TOP most frequent tokens')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of files counted in parallel')
+    parser.add_argument('--buffer', type=int, default=1 << 20,
+                        help='characters read from a file at a time')
+    args = parser.parse_args(args)
 
     try:
-        file_path = args[0]
-        print_token_freqs(compute_word_freq(tokenize(file_path)))
-    except OSError:
-        print(f'Could not open file at path "{file_path}".')
+        token_freq = count_files_tokens(args.paths, args.jobs, args.buffer)
+    except OSError as e:
+        print(f'Could not open file at path "{e.filename}".')
+        return
     except UnicodeDecodeError:
         print('File has non-unicode characters.')
+        return
+
+    if args.top is None:
+        print_token_freqs(token_freq)
+    else:
+        print_top_token_freqs(token_freq, args.top)
 
 
 # Program logic.
 if __name__ == '__main__':
     _program(sys.argv[1:]) # Discard first argument (program name)
-
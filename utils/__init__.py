@@ -1,7 +1,12 @@
 import os
+import re
+import atexit
 import logging
 from hashlib import sha256
-from urllib.parse import urlparse
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from threading import Lock
+from urllib.parse import urlsplit, urlunsplit, urljoin, unquote_plus
 
 def get_logger(name, filename=None):
     logger = logging.getLogger(name)
@@ -17,19 +22,118 @@ def get_logger(name, filename=None):
     fh.setFormatter(formatter)
     ch.setFormatter(formatter)
     # add the handlers to the logger
-    logger.addHandler(fh)
-    logger.addHandler(ch)
+    logger.addHandler(queued(fh))
+    logger.addHandler(queued(ch))
     return logger
 
 
-def get_urlhash(url):
-    parsed = urlparse(url)
-    # everything other than scheme.
+# Log records go through one queue to a listener thread, which does the
+# writing, so logging never makes a crawl thread wait on the disk or the
+# terminal. The queue is drained when the process exits.
+_log_queue = SimpleQueue()
+_log_listener = None
+_log_listener_lock = Lock()
+
+
+class _Dispatcher(object):
+    # Hands every record to the handler it was queued for.
+    def handle(self, record):
+        record.handler.handle(record)
+
+
+class _QueuedHandler(QueueHandler):
+    def __init__(self, handler):
+        super().__init__(_log_queue)
+        self.handler = handler
+        self.setLevel(handler.level)
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        record.handler = self.handler
+        return record
+
+
+# Returns a handler that queues records for [handler] to write on the
+# listener thread.
+def queued(handler):
+    global _log_listener
+    with _log_listener_lock:
+        if _log_listener is None:
+            _log_listener = QueueListener(_log_queue, _Dispatcher())
+            _log_listener.start()
+            atexit.register(_log_listener.stop)
+    return _QueuedHandler(handler)
+
+
+# Pass canonical=True for a url that canonicalize() returned, to skip doing
+# it again.
+def get_urlhash(url, canonical=False):
+    parsed = urlsplit(url if canonical else canonicalize(url))
+    # everything other than scheme and fragment, so http and https versions
+    # of a page share a hash, as do query strings in a different order.
     return sha256(
-        f"{parsed.netloc}/{parsed.path}/{parsed.params}/"
-        f"{parsed.query}/{parsed.fragment}".encode("utf-8")).hexdigest()
+        f"{parsed.netloc}/{parsed.path}/{parsed.query}".encode("utf-8")).hexdigest()
 
 def normalize(url):
     if url.endswith("/"):
         return url.rstrip("/")
     return url
+
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Query parameters that only track the visitor or the session, and never
+# change the page.
+IGNORED_QUERY_PARAMS = frozenset([
+    "utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content",
+    "fbclid", "gclid", "sid", "sessionid", "session_id", "jsessionid",
+    "phpsessid", "share", "replytocom"])
+
+SESSION_PATH_PARAM = re.compile(r";(jsessionid|phpsessid|sid)=[^/;?]*", re.IGNORECASE)
+
+# Returns the canonical form of [url], resolved against [base] if it is
+# relative: scheme and host lowercased, default port, user info, session ids,
+# tracking parameters and fragment dropped, dot segments resolved, query
+# parameters sorted and trailing slashes stripped. Returns None for urls that
+# cannot be parsed.
+def canonicalize(url, base=None):
+    try:
+        if base:
+            url = urljoin(base, url.strip())
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        host = parts.hostname or ""
+        port = parts.port
+    except ValueError:
+        return None
+    netloc = host
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{port}"
+    path = SESSION_PATH_PARAM.sub("", parts.path)
+    if netloc and "." in path:
+        path = _remove_dot_segments(path)
+    # Parameters are kept as they are, neither decoded nor encoded again,
+    # since that can change what the server sees.
+    query = "&".join(sorted(
+        parameter for parameter in parts.query.split("&")
+        if parameter and unquote_plus(
+            parameter.split("=", 1)[0]).lower() not in IGNORED_QUERY_PARAMS))
+    return normalize(urlunsplit((scheme, netloc, path, query, "")))
+
+
+# Resolves the . and .. segments of absolute [path] as in RFC 3986 5.2.4. Only
+# the path is looked at, unlike urljoin, which takes a path starting with //
+# for a host.
+def _remove_dot_segments(path):
+    segments = path.split("/")
+    output = [""]
+    for segment in segments[1:]:
+        if segment == "..":
+            if len(output) > 1:
+                output.pop()
+        elif segment != ".":
+            output.append(segment)
+    if segments[-1] in (".", ".."):
+        # A path ending in a dot segment ends in a directory.
+        output.append("")
+    return "/".join(output)
@@ -0,0 +1,154 @@
+import asyncio
+import cbor
+
+from urllib.parse import urlencode
+
+from utils.download import NO_RESPONSE, cacheable
+from utils.metrics import metrics
+from utils.response import Response
+from utils.response_store import open_response_store
+
+
+# Asyncio counterpart of utils.download.download.
+#
+# CacheClient keeps a pool of keep-alive HTTP/1.1 connections to the cache
+# server, so many fetches can be in flight at once without a new connection
+# per url. Every attempt is bounded by config.timeout; failed attempts are
+# retried config.retries times, waiting config.backoff * 2 ** attempt seconds
+# in between. Politeness stays with the frontier, which only hands out urls
+# whose host may be fetched from.
+
+class CacheServerError(Exception):
+    pass
+
+
+class CacheClient(object):
+    def __init__(self, config, logger=None, pool_size=None):
+        self.config = config
+        self.logger = logger
+        self.host, self.port = config.cache_server
+        self.pool_size = pool_size or config.max_inflight
+        self.slots = asyncio.Semaphore(self.pool_size)
+        self.idle = list() # Idle (reader, writer) connections.
+        self.store = open_response_store(config)
+
+    async def _acquire(self):
+        await self.slots.acquire()
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer
+            writer.close()
+        try:
+            return await asyncio.open_connection(self.host, self.port)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def _release(self, connection, reusable):
+        if reusable:
+            self.idle.append(connection)
+        else:
+            connection[1].close()
+        self.slots.release()
+
+    async def _request(self, url):
+        # Returns (status, body) of one GET to the cache server.
+        query = urlencode([("q", url), ("u", self.config.user_agent)])
+        request = (
+            f"GET /?{query} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Connection: keep-alive\r\n\r\n").encode("ascii")
+        connection = await self._acquire()
+        reader, writer = connection
+        reusable = False
+        try:
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+            if not status_line:
+                raise CacheServerError("Connection closed by cache server.")
+            version, status = status_line.split(None, 2)[:2]
+            headers = dict()
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await self._read_body(reader, headers)
+            reusable = (
+                "content-length" in headers
+                or headers.get("transfer-encoding", "").lower() == "chunked"
+            ) and headers.get("connection", "").lower() != "close" \
+                and version == b"HTTP/1.1"
+            return int(status), body
+        finally:
+            self._release(connection, reusable)
+
+    async def _read_body(self, reader, headers):
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = list()
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # Skip trailers.
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    return b"".join(chunks)
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+        if "content-length" in headers:
+            return await reader.readexactly(int(headers["content-length"]))
+        return await reader.read()
+
+    async def download(self, url, refresh=False):
+        # Reads through the local response store, like download does, and
+        # downloads [url] anyway with [refresh]. The
+        # store reads, writes and compresses in the default executor, so the
+        # event loop keeps serving the other fetches meanwhile.
+        loop = asyncio.get_running_loop()
+        if self.store is not None and not refresh:
+            resp = await loop.run_in_executor(None, self.store.get, url)
+            if resp is not None:
+                metrics.inc("response_store_hits_total")
+                return resp
+        with metrics.time("download"):
+            resp = await self._download(url)
+        metrics.inc("downloads_total", status=str(resp.status))
+        if self.store is not None and cacheable(resp):
+            await loop.run_in_executor(None, self.store.put, url, resp)
+        return resp
+
+    async def _download(self, url):
+        error, status = None, NO_RESPONSE
+        for attempt in range(self.config.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.config.backoff * 2 ** (attempt - 1))
+            try:
+                status, body = await asyncio.wait_for(
+                    self._request(url), self.config.timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                    CacheServerError, ValueError) as e:
+                error = f"Spacetime connection error {e!r} with url {url}."
+                status = NO_RESPONSE
+                continue
+            if 200 <= status < 400 and body:
+                try:
+                    return Response(cbor.loads(body))
+                except (EOFError, ValueError):
+                    pass
+            error = f"Spacetime Response error <{status}> with url {url}."
+            if status < 500:
+                # The cache server answered; trying again will not help.
+                return self._error_response(error, status, url)
+        return self._error_response(error, status, url)
+
+    def _error_response(self, error, status, url):
+        if self.logger:
+            self.logger.error(error)
+        return Response({"error": error, "status": status, "url": url})
+
+    def close(self):
+        while self.idle:
+            self.idle.pop()[1].close()
@@ -9,11 +9,90 @@ class Config(object):
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.store = config["LOCAL PROPERTIES"].get("STORE", "shelve").strip()
+        self.batch_size = int(config["LOCAL PROPERTIES"].get("BATCHSIZE", "1000"))
+        self.batch_interval = float(config["LOCAL PROPERTIES"].get("BATCHINTERVAL", "5"))
+        self.resume = config["LOCAL PROPERTIES"].get("RESUME", "eager").strip()
+        self.resume_chunk = int(config["LOCAL PROPERTIES"].get("RESUMECHUNK", "10000"))
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
+        self.registration_ttl = float(config["CONNECTION"].get("REGISTRATIONTTL", "0"))
+        self.timeout = float(config["CONNECTION"].get("TIMEOUT", "30"))
+        self.retries = int(config["CONNECTION"].get("RETRIES", "2"))
+        self.backoff = float(config["CONNECTION"].get("BACKOFF", "1"))
+        self.async_download = config["LOCAL PROPERTIES"].getboolean("ASYNC", False)
+        self.max_inflight = int(config["LOCAL PROPERTIES"].get("INFLIGHT", "16"))
+        self.parse_processes = int(config["LOCAL PROPERTIES"].get("PARSERS", "0"))
+        self.parse_queue = int(config["LOCAL PROPERTIES"].get("PARSEQUEUE", "64"))
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
 
-        self.cache_server = None
\ No newline at end of file
+        self.adaptive = config.getboolean("RATE", "ADAPTIVE", fallback=False)
+        # Never faster than POLITENESS unless MINDELAY says so.
+        min_delay = config.get("RATE", "MINDELAY", fallback="").strip()
+        self.min_delay = float(min_delay) if min_delay else self.time_delay
+        self.max_delay = float(config.get("RATE", "MAXDELAY", fallback="30"))
+        self.latency_factor = float(config.get("RATE", "LATENCYFACTOR", fallback="2"))
+        self.max_failures = int(config.get("RATE", "FAILURES", fallback="5"))
+        self.suspend_time = float(config.get("RATE", "SUSPEND", fallback="300"))
+        self.max_suspensions = int(config.get("RATE", "MAXSUSPENSIONS", fallback="3"))
+
+        self.policy = config.get("SCHEDULING", "POLICY", fallback="score").strip()
+        self.max_depth = int(config.get("SCHEDULING", "MAXDEPTH", fallback="20"))
+        self.depth_weight = float(config.get("SCHEDULING", "DEPTHWEIGHT", fallback="1"))
+        self.word_weight = float(config.get("SCHEDULING", "WORDWEIGHT", fallback="0.5"))
+        self.host_weight = float(config.get("SCHEDULING", "HOSTWEIGHT", fallback="0.5"))
+        self.memory_urls = int(config.get("SCHEDULING", "MEMORYURLS", fallback="1000000"))
+
+        self.incremental = config.getboolean("RECRAWL", "INCREMENTAL", fallback=False)
+        self.recrawl_initial = float(config.get("RECRAWL", "INITIALINTERVAL", fallback="86400"))
+        self.recrawl_min = float(config.get("RECRAWL", "MININTERVAL", fallback="3600"))
+        self.recrawl_max = float(config.get("RECRAWL", "MAXINTERVAL", fallback="2592000"))
+
+        # Directory of the local response store, None for no store.
+        self.response_cache = config.get("RESPONSECACHE", "DIRECTORY", fallback="").strip() or None
+        self.segment_size = int(config.get("RESPONSECACHE", "SEGMENTSIZE", fallback="268435456"))
+        self.compress_level = int(config.get("RESPONSECACHE", "LEVEL", fallback="6"))
+
+        self.expected_urls = int(config.get("DEDUP", "EXPECTEDURLS", fallback="1000000"))
+        self.dedup_fp_rate = float(config.get("DEDUP", "FALSEPOSITIVE", fallback="1e-6"))
+        self.dedup_bloom = config.getboolean("DEDUP", "BLOOM", fallback=False)
+        self.similarity = float(config.get("DEDUP", "SIMILARITY", fallback="0.95"))
+        self.similarity_min_words = int(config.get("DEDUP", "SIMILARITYMINWORDS", fallback="20"))
+
+        self.host_budget = int(config.get("TRAPS", "HOSTBUDGET", fallback="20000"))
+        self.template_budget = int(config.get("TRAPS", "TEMPLATEBUDGET", fallback="500"))
+        self.max_repeats = int(config.get("TRAPS", "MAXREPEATS", fallback="2"))
+        self.sketch_width = int(config.get("TRAPS", "SKETCHWIDTH", fallback="65536"))
+        self.sketch_depth = int(config.get("TRAPS", "SKETCHDEPTH", fallback="4"))
+
+        self.top_words = int(config.get("STATS", "TOPWORDS", fallback="50"))
+        self.top_capacity = int(config.get("STATS", "TOPCAPACITY", fallback="10000"))
+        self.snapshot_interval = float(config.get("STATS", "SNAPSHOTINTERVAL", fallback="60"))
+
+        self.metrics_port = int(config.get("METRICS", "PORT", fallback="0"))
+        # File the metrics are written to, None for no file.
+        self.metrics_file = config.get("METRICS", "FILE", fallback="").strip() or None
+        self.metrics_interval = float(config.get("METRICS", "INTERVAL", fallback="10"))
+
+        # Directory of the columnar export, None for no export.
+        self.export_dir = config.get("EXPORT", "DIRECTORY", fallback="").strip() or None
+        self.export_batch = int(config.get("EXPORT", "BATCHSIZE", fallback="1000"))
+
+        # host:port of every node of a distributed crawl, empty for one node.
+        self.cluster_nodes = [
+            (node.strip().rsplit(":", 1)[0], int(node.strip().rsplit(":", 1)[1]))
+            for node in config.get("CLUSTER", "NODES", fallback="").split(",")
+            if node.strip()]
+        self.node_id = int(config.get("CLUSTER", "NODEID", fallback="0"))
+        self.forward_batch = int(config.get("CLUSTER", "FORWARDBATCH", fallback="100"))
+        self.forward_interval = float(config.get("CLUSTER", "FORWARDINTERVAL", fallback="0.5"))
+
+        self.cache_server = None
+        cache_server = config["CONNECTION"].get("CACHESERVER", "").strip()
+        if cache_server:
+            # Use this cache server directly instead of registering.
+            host, port = cache_server.rsplit(":", 1)
+            self.cache_server = (host, int(port))
\ No newline at end of file
@@ -0,0 +1,203 @@
+import math
+import struct
+
+from hashlib import blake2b
+from threading import Lock
+
+
+# Compact sets used to remember urls and page contents that were already seen.
+# They only store fixed size digests of their keys, so membership has a small
+# false positive rate but memory does not grow with the length of the keys.
+#
+# DigestSet keeps raw 8-16 byte digests in one bytearray used as an open
+# addressing table. BloomFilter trades exactness for about 1-2 bytes per key.
+# Both accept str or bytes keys, are thread safe, and can be saved and loaded.
+
+MIN_DIGEST_SIZE = 8
+MAX_DIGEST_SIZE = 16
+
+DIGEST_SET_MAGIC = b"DSET"
+BLOOM_FILTER_MAGIC = b"BLMF"
+HEADER = struct.Struct("<4sIQQ")
+
+
+def _digest(key, digest_size):
+    if isinstance(key, str):
+        key = key.encode("utf-8")
+    return blake2b(key, digest_size=digest_size).digest()
+
+
+# Returns the smallest digest size in bytes for which a set holding
+# [expected_items] keys has at most [fp_rate] chance of a false positive on a
+# lookup, within the 8-16 byte range.
+def digest_size_for(expected_items, fp_rate):
+    bits = math.log2(max(expected_items, 1) / fp_rate)
+    return min(max(math.ceil(bits / 8), MIN_DIGEST_SIZE), MAX_DIGEST_SIZE)
+
+
+class DigestSet(object):
+    def __init__(self, capacity=1024, digest_size=MIN_DIGEST_SIZE):
+        assert MIN_DIGEST_SIZE <= digest_size <= MAX_DIGEST_SIZE
+        self.digest_size = digest_size
+        self.empty = bytes(digest_size)
+        self.count = 0
+        self.lock = Lock()
+        # Keep the table at most half full so probe chains stay short.
+        slots = 1
+        while slots < capacity * 2:
+            slots *= 2
+        self.slots = slots
+        self.table = bytearray(slots * digest_size)
+
+    def _find(self, digest):
+        # Returns (found, offset) where offset is the slot holding digest, or
+        # the empty slot it would be inserted at.
+        size = self.digest_size
+        mask = self.slots - 1
+        slot = int.from_bytes(digest[:8], "little") & mask
+        table = self.table
+        while True:
+            offset = slot * size
+            entry = table[offset:offset + size]
+            if entry == digest:
+                return True, offset
+            if entry == self.empty:
+                return False, offset
+            slot = (slot + 1) & mask
+
+    def _grow(self):
+        old_table, size = self.table, self.digest_size
+        self.slots *= 2
+        self.table = bytearray(self.slots * size)
+        for offset in range(0, len(old_table), size):
+            digest = old_table[offset:offset + size]
+            if digest != self.empty:
+                _, new_offset = self._find(digest)
+                self.table[new_offset:new_offset + size] = digest
+
+    def _key_digest(self, key):
+        digest = _digest(key, self.digest_size)
+        if digest == self.empty:
+            # All zero marks an empty slot.
+            digest = digest[:-1] + b"\x01"
+        return digest
+
+    # Adds [key] to the set. Returns True if it was not in the set before.
+    def add(self, key):
+        digest = self._key_digest(key)
+        with self.lock:
+            found, offset = self._find(digest)
+            if found:
+                return False
+            self.table[offset:offset + self.digest_size] = digest
+            self.count += 1
+            if self.count * 2 > self.slots:
+                self._grow()
+            return True
+
+    def __contains__(self, key):
+        digest = self._key_digest(key)
+        with self.lock:
+            return self._find(digest)[0]
+
+    def __len__(self):
+        return self.count
+
+    def save(self, path):
+        with self.lock, open(path, "wb") as file:
+            file.write(HEADER.pack(
+                DIGEST_SET_MAGIC, self.digest_size, self.count, self.slots))
+            file.write(self.table)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            magic, digest_size, count, slots = HEADER.unpack(
+                file.read(HEADER.size))
+            if magic != DIGEST_SET_MAGIC:
+                raise ValueError(f"{path} is not a saved DigestSet.")
+            digest_set = cls(1, digest_size)
+            digest_set.count = count
+            digest_set.slots = slots
+            digest_set.table = bytearray(file.read())
+        return digest_set
+
+
+class BloomFilter(object):
+    def __init__(self, capacity=1024, fp_rate=0.01):
+        capacity = max(capacity, 1)
+        bits = math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)
+        self.bit_count = max(bits, 8)
+        self.hash_count = max(round(self.bit_count / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+        self.lock = Lock()
+
+    def _positions(self, key):
+        # Double hashing: hash_count positions from two 64 bit hashes.
+        digest = _digest(key, 16)
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.bit_count
+                for i in range(self.hash_count)]
+
+    # Adds [key] to the filter. Returns True if it was not in the filter before.
+    def add(self, key):
+        positions = self._positions(key)
+        with self.lock:
+            new = False
+            for position in positions:
+                byte, bit = divmod(position, 8)
+                if not self.bits[byte] & (1 << bit):
+                    self.bits[byte] |= 1 << bit
+                    new = True
+            if new:
+                self.count += 1
+            return new
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key))
+
+    def __len__(self):
+        return self.count
+
+    def save(self, path):
+        with self.lock, open(path, "wb") as file:
+            file.write(HEADER.pack(
+                BLOOM_FILTER_MAGIC, self.hash_count, self.count,
+                self.bit_count))
+            file.write(self.bits)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            magic, hash_count, count, bit_count = HEADER.unpack(
+                file.read(HEADER.size))
+            if magic != BLOOM_FILTER_MAGIC:
+                raise ValueError(f"{path} is not a saved BloomFilter.")
+            bloom = cls()
+            bloom.hash_count = hash_count
+            bloom.count = count
+            bloom.bit_count = bit_count
+            bloom.bits = bytearray(file.read())
+        return bloom
+
+
+# Returns an empty dedup set sized for [expected_items] keys with at most
+# [fp_rate] chance of a false positive per lookup.
+def make_dedup_set(expected_items, fp_rate, bloom=False):
+    if bloom:
+        return BloomFilter(expected_items, fp_rate)
+    return DigestSet(
+        min(expected_items, 1 << 16), digest_size_for(expected_items, fp_rate))
+
+
+def load_dedup_set(path):
+    with open(path, "rb") as file:
+        magic = file.read(4)
+    if magic == BLOOM_FILTER_MAGIC:
+        return BloomFilter.load(path)
+    return DigestSet.load(path)
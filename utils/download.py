@@ -1,21 +1,76 @@
-import requests
-import cbor
 import time
 
+from utils.metrics import metrics
 from utils.response import Response
+from utils.response_store import open_response_store
 
-def download(url, config, logger=None):
+# Status of a Response when the cache server could not be reached at all.
+NO_RESPONSE = 0
+
+def download(url, config, logger=None, refresh=False):
+    # Reads through the local response store, if there is one. With
+    # [refresh], e.g. for a url recrawled in incremental mode, the stored
+    # response is not used but replaced by the new one.
+    store = open_response_store(config)
+    if store is not None and not refresh:
+        resp = store.get(url)
+        if resp is not None:
+            metrics.inc("response_store_hits_total")
+            return resp
+    with metrics.time("download"):
+        resp = _download(url, config, logger)
+    metrics.inc("downloads_total", status=str(resp.status))
+    if store is not None and cacheable(resp):
+        store.put(url, resp)
+    return resp
+
+def host_failed(status):
+    # True if the host could not serve the url: no response, 429 or a server
+    # error. Statuses from 600 up are the cache server's verdict on the url
+    # itself, such as a bad url, a page too big or one denied by robots.txt,
+    # and say nothing about the host.
+    return status == NO_RESPONSE or status == 429 or 500 <= status < 600
+
+def cacheable(resp):
+    # Failures of the host may not happen next time, and the verdicts of the
+    # cache server are not responses of the host.
+    return not host_failed(resp.status) and resp.status < 600
+
+def _download(url, config, logger=None):
+    # Like CacheClient._download, tries again when the cache server could not
+    # be reached or failed, waiting BACKOFF * 2 ** attempt seconds in between.
+    for attempt in range(config.retries + 1):
+        if attempt:
+            time.sleep(config.backoff * 2 ** (attempt - 1))
+        resp, retry = _request(url, config, logger)
+        if not retry:
+            break
+    return resp
+
+def _request(url, config, logger=None):
+    # Returns the Response, and whether trying again may help. requests and
+    # cbor are imported here, so importing this module stays fast.
+    import requests
+    import cbor
     host, port = config.cache_server
-    resp = requests.get(
-        f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+    try:
+        resp = requests.get(
+            f"http://{host}:{port}/",
+            params=[("q", f"{url}"), ("u", f"{config.user_agent}")],
+            timeout=config.timeout)
+    except requests.RequestException as e:
+        logger.error(f"Spacetime connection error {e!r} with url {url}.")
+        return Response({
+            "error": f"Spacetime connection error {e!r} with url {url}.",
+            "status": NO_RESPONSE,
+            "url": url}), True
     try:
         if resp and resp.content:
-            return Response(cbor.loads(resp.content))
+            return Response(cbor.loads(resp.content)), False
     except (EOFError, ValueError) as e:
         pass
     logger.error(f"Spacetime Response error {resp} with url {url}.")
     return Response({
         "error": f"Spacetime Response error {resp} with url {url}.",
         "status": resp.status_code,
-        "url": url})
+        "url": url}), resp.status_code >= 500
@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import shutil
+
+from array import array
+from threading import Lock
+
+
+# Columnar export of what the scraper learns about every page.
+#
+# Every url gets an id, its line number in urls.txt, and every word an id,
+# its line number in words.txt. The rest are column files of fixed size
+# integers, appended to in batches of batch_size pages:
+#
+#     pages.url, pages.words, pages.fingerprint
+#         id, number of words and simhash of every page parsed
+#     edges.src, edges.dst
+#         the link graph: one entry per link, from page id to url id
+#     tokens.page, tokens.word, tokens.count
+#         word counts of every page, stop words excluded
+#
+# Columns of a group always have the same length: when the export is opened
+# again after a crash, the columns of a group are cut to the shortest.
+# meta.json has the type of every column, for numpy.fromfile. analyze.py
+# computes the report from these files.
+
+COLUMNS = {
+    "pages.url": "I", "pages.words": "I", "pages.fingerprint": "Q",
+    "edges.src": "I", "edges.dst": "I",
+    "tokens.page": "I", "tokens.word": "I", "tokens.count": "I",
+}
+GROUPS = [
+    ["pages.url", "pages.words", "pages.fingerprint"],
+    ["edges.src", "edges.dst"],
+    ["tokens.page", "tokens.word", "tokens.count"],
+]
+# Numpy dtype of every array typecode above.
+DTYPES = {"I": "uint32", "Q": "uint64"}
+
+
+def _read_lines(path):
+    # Returns the lines of [path], dropping a last line cut off by a crash.
+    if not os.path.exists(path):
+        return list()
+    with open(path, "r+b") as file:
+        content = file.read()
+        end = content.rfind(b"\n") + 1
+        file.truncate(end)
+    return content[:end].decode("utf-8").split("\n")[:-1]
+
+
+class CrawlExporter(object):
+    def __init__(self, directory, batch_size=1000, restart=False):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.lock = Lock()
+        if restart and os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory, exist_ok=True)
+        self.urls = {url: i for i, url in enumerate(
+            _read_lines(self._path("urls.txt")))}
+        self.words = {word: i for i, word in enumerate(
+            _read_lines(self._path("words.txt")))}
+        self._truncate()
+        self.new_urls = list()
+        self.new_words = list()
+        self.columns = {name: array(code) for name, code in COLUMNS.items()}
+        self.pages = 0 # Pages in the current batch.
+        with open(self._path("meta.json"), "w") as file:
+            json.dump({
+                "byteorder": sys.byteorder,
+                "columns": {name: DTYPES[code] for name, code in COLUMNS.items()},
+            }, file)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _truncate(self):
+        # Cuts the columns of every group to the length of the shortest.
+        for group in GROUPS:
+            lengths = list()
+            for name in group:
+                path = self._path(name)
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                lengths.append(size // array(COLUMNS[name]).itemsize)
+            for name in group:
+                with open(self._path(name), "ab") as file:
+                    file.truncate(min(lengths) * array(COLUMNS[name]).itemsize)
+
+    def _url_id(self, url):
+        # Must be called with the lock held.
+        url_id = self.urls.get(url)
+        if url_id is None:
+            url_id = self.urls[url] = len(self.urls)
+            self.new_urls.append(url)
+        return url_id
+
+    def _word_id(self, word):
+        # Must be called with the lock held.
+        word_id = self.words.get(word)
+        if word_id is None:
+            word_id = self.words[word] = len(self.words)
+            self.new_words.append(word)
+        return word_id
+
+    # Records page [url] with [word_count] words, simhash [fingerprint],
+    # word counts [words] and links [links].
+    def add_page(self, url, word_count, fingerprint, words, links):
+        with self.lock:
+            columns = self.columns
+            page_id = self._url_id(url)
+            columns["pages.url"].append(page_id)
+            columns["pages.words"].append(word_count)
+            columns["pages.fingerprint"].append(fingerprint)
+            for link in links:
+                columns["edges.src"].append(page_id)
+                columns["edges.dst"].append(self._url_id(link))
+            for word, count in words.items():
+                columns["tokens.page"].append(page_id)
+                columns["tokens.word"].append(self._word_id(word))
+                columns["tokens.count"].append(count)
+            self.pages += 1
+            if self.pages >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        # Must be called with the lock held. Ids are written before the
+        # columns that use them.
+        for name, new in (("urls.txt", self.new_urls), ("words.txt", self.new_words)):
+            if new:
+                with open(self._path(name), "a", encoding="utf-8") as file:
+                    file.write("".join(f"{line}\n" for line in new))
+                new.clear()
+        for name, column in self.columns.items():
+            with open(self._path(name), "ab") as file:
+                column.tofile(file)
+            del column[:]
+        self.pages = 0
+
+    def flush(self):
+        with self.lock:
+            self._flush()
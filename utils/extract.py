@@ -0,0 +1,72 @@
+from urllib.parse import urljoin
+
+from lxml import etree
+
+from utils import canonicalize
+
+
+# Single pass text and link extraction over lxml's event parser.
+#
+# PageExtractor is a parser target: lxml calls it for every start tag, end
+# tag and run of text while it parses, and no tree is ever built. It keeps the
+# text outside of script, style and template elements, which is the text
+# BeautifulSoup's get_text() returns, and the href of every <a>. Hrefs are
+# resolved when parsing ends, against the href of the first <base> if any and
+# otherwise against the url of the page, so a <base> after the links still
+# applies to them. Hrefs that do not make an http(s) url, such as mailto: and
+# javascript: links or ones that cannot be parsed, are left out.
+
+SKIPPED_TEXT_TAGS = frozenset(["script", "style", "template"])
+LINK_SCHEMES = ("http://", "https://")
+
+
+class PageExtractor(object):
+    def __init__(self, base_url=None):
+        self.base_url = base_url
+        self.base_href = None
+        self.text = list()
+        self.hrefs = list()
+        self.skip_depth = 0 # Number of open elements whose text is skipped.
+
+    def start(self, tag, attrib):
+        if tag in SKIPPED_TEXT_TAGS:
+            self.skip_depth += 1
+        elif tag == "a":
+            href = attrib.get("href")
+            if href is not None:
+                self.hrefs.append(href)
+        elif tag == "base" and self.base_href is None:
+            self.base_href = attrib.get("href")
+
+    def end(self, tag):
+        if tag in SKIPPED_TEXT_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def data(self, data):
+        if not self.skip_depth:
+            self.text.append(data)
+
+    def close(self):
+        base_url = self.base_url
+        if self.base_href:
+            base_url = urljoin(base_url or "", self.base_href.strip())
+        links = list()
+        for href in self.hrefs:
+            link = canonicalize(href, base_url)
+            if link is not None and link.startswith(LINK_SCHEMES):
+                links.append(link)
+        return "".join(self.text), links
+
+
+# Returns (text, links) of the html [content], links resolved against
+# [base_url], in canonical form (see utils.canonicalize) and http(s) only.
+def extract(content, base_url=None):
+    if not content:
+        return "", []
+    target = PageExtractor(base_url)
+    parser = etree.HTMLParser(target=target)
+    try:
+        parser.feed(content)
+        return parser.close()
+    except etree.LxmlError:
+        return target.close() # Whatever was parsed before the error.
@@ -0,0 +1,204 @@
+import os
+import time
+
+from bisect import bisect_left
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread, Lock, Event, local
+
+
+# Counters and timers of the hot path, readable while crawling.
+#
+# Like utils/stats.py, every thread records into its own MetricsShard, so
+# recording never takes a lock; reading merges the shards. Timers keep a
+# histogram of how long a stage took, with the buckets below. Gauges are
+# functions called when the metrics are read, such as the queue depth per
+# host of the frontier. render() writes all of them in the Prometheus text
+# format, which serve() answers on http://localhost:<port>/metrics and
+# start_file() writes to a file every few seconds, see [METRICS] in
+# config.ini.
+#
+# The module keeps one Metrics instance, metrics, for the whole process.
+
+PREFIX = "crawler_"
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0)
+
+
+class Timer(object):
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1) # The last one is +Inf.
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        for i, count in enumerate(other.buckets):
+            self.buckets[i] += count
+
+
+class MetricsShard(object):
+    # Only ever written by the thread that owns it.
+    def __init__(self):
+        self.counters = Counter() # (name, labels) -> count.
+        self.timers = dict() # Stage -> Timer.
+
+
+class _Timing(object):
+    # Context manager that times one run of a stage.
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    # Prometheus label set of a tuple of (name, value) pairs.
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Metrics(object):
+    def __init__(self):
+        self.shards = list()
+        self.shards_lock = Lock() # Only taken when a thread makes its shard.
+        self.local = local()
+        self.gauges = dict() # Name -> (function, label name or None).
+        self.started = time.time()
+        self.stop_file = Event()
+
+    def shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = MetricsShard()
+            with self.shards_lock:
+                self.shards.append(shard)
+            return shard
+
+    def inc(self, name, value=1, **labels):
+        self.shard().counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, stage, seconds):
+        timers = self.shard().timers
+        timer = timers.get(stage)
+        if timer is None:
+            timer = timers[stage] = Timer()
+        timer.observe(seconds)
+
+    # with metrics.time("download"): ... records how long the block took.
+    def time(self, stage):
+        return _Timing(self, stage)
+
+    # Registers gauge [name], read by calling [function]. With [label], the
+    # function returns a dict of label value -> value, otherwise a number.
+    # A gauge registered again replaces the earlier one.
+    def gauge(self, name, function, label=None):
+        self.gauges[name] = (function, label)
+
+    def merged(self):
+        # Returns (counters, timers) over all shards. Like CrawlStats, a
+        # shard may be written while this runs.
+        with self.shards_lock:
+            shards = list(self.shards)
+        counters = Counter()
+        timers = dict()
+        for shard in shards:
+            counters.update(shard.counters.copy())
+            for stage, timer in list(shard.timers.items()):
+                timers.setdefault(stage, Timer()).merge(timer)
+        return counters, timers
+
+    def render(self):
+        # All metrics in the Prometheus text format.
+        counters, timers = self.merged()
+        lines = [
+            f"# TYPE {PREFIX}uptime_seconds gauge",
+            f"{PREFIX}uptime_seconds {time.time() - self.started:.3f}"]
+        names = sorted({name for name, _ in counters})
+        for name in names:
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            for (counter, labels), count in sorted(counters.items()):
+                if counter == name:
+                    lines.append(f"{PREFIX}{name}{_labels(labels)} {count}")
+        if timers:
+            lines.append(f"# TYPE {PREFIX}stage_seconds histogram")
+        for stage, timer in sorted(timers.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), timer.buckets):
+                cumulative += count
+                labels = _labels((("stage", stage), ("le", bound)))
+                lines.append(f"{PREFIX}stage_seconds_bucket{labels} {cumulative}")
+            labels = _labels((("stage", stage),))
+            lines.append(f"{PREFIX}stage_seconds_sum{labels} {timer.total:.6f}")
+            lines.append(f"{PREFIX}stage_seconds_count{labels} {timer.count}")
+        for name, (function, label) in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            value = function()
+            if label is None:
+                lines.append(f"{PREFIX}{name} {value}")
+                continue
+            for label_value, gauge_value in sorted(value.items()):
+                lines.append(
+                    f"{PREFIX}{name}{_labels(((label, label_value),))} {gauge_value}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, path):
+        # Written to a temporary file first, so readers never see half of it.
+        with open(f"{path}.tmp", "w") as file:
+            file.write(self.render())
+        os.replace(f"{path}.tmp", path)
+
+    def start_file(self, path, interval):
+        def file_loop():
+            while not self.stop_file.wait(interval):
+                self.save(path)
+        Thread(target=file_loop, daemon=True).start()
+
+    def serve(self, port):
+        # Answers GET /metrics on localhost:[port] in a background thread.
+        # Stop it with server.shutdown().
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(("localhost", port), Handler)
+        server.daemon_threads = True
+        Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+metrics = Metrics()
@@ -0,0 +1,117 @@
+from array import array
+from collections import defaultdict
+from hashlib import blake2b
+from threading import Lock
+
+
+# Near duplicate detection with 64 bit SimHash fingerprints.
+#
+# Two pages are near duplicates when their fingerprints differ in at most
+# max_distance bits. The index splits fingerprints into max_distance + 1
+# bands; by the pigeonhole principle two such fingerprints share at least one
+# band exactly, so only fingerprints in the same band bucket are compared and
+# lookups stay far below a scan of every page seen.
+
+FINGERPRINT_BITS = 64
+
+
+def _feature_hash(token):
+    return int.from_bytes(
+        blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+# Returns the 64 bit SimHash of [token_counts], a mapping of token -> count
+# such as the Counter of tokenizer._tokenize_string over a page.
+def simhash(token_counts):
+    # The feature hashes of the tokens with the same count are joined as
+    # strings of 64 binary digits, so the ones of every bit are counted by
+    # str.count over a slice instead of bit by bit per token.
+    features = defaultdict(list)
+    total = 0
+    for token, count in token_counts.items():
+        features[count].append(f"{_feature_hash(token):064b}")
+        total += count
+    ones = [0] * FINGERPRINT_BITS # Weight of the tokens with the bit set.
+    for count, digits in features.items():
+        digits = "".join(digits)
+        for i in range(FINGERPRINT_BITS):
+            ones[i] += count * digits[i::FINGERPRINT_BITS].count("1")
+    fingerprint = 0
+    for i, weight in enumerate(ones):
+        # Digit i is bit 63 - i. The bit is set when the tokens with it
+        # outweigh the ones without.
+        if 2 * weight > total:
+            fingerprint |= 1 << (FINGERPRINT_BITS - 1 - i)
+    return fingerprint
+
+
+# Number of differing bits two fingerprints may have to still be considered
+# at least [similarity] similar.
+def max_distance_for(similarity):
+    return int((1 - similarity) * FINGERPRINT_BITS)
+
+
+class SimhashIndex(object):
+    def __init__(self, similarity=0.95):
+        self.max_distance = max_distance_for(similarity)
+        band_count = self.max_distance + 1
+        # (shift, mask) per band, spreading the 64 bits as evenly as possible.
+        self.bands = list()
+        start = 0
+        for band in range(band_count):
+            width = (FINGERPRINT_BITS - start) // (band_count - band)
+            self.bands.append((start, (1 << width) - 1))
+            start += width
+        self.buckets = [dict() for _ in self.bands]
+        self.fingerprints = array("Q")
+        self.lock = Lock()
+
+    def _keys(self, fingerprint):
+        return [fingerprint >> shift & mask for shift, mask in self.bands]
+
+    def _find(self, fingerprint, keys):
+        for buckets, key in zip(self.buckets, keys):
+            for other in buckets.get(key, ()):
+                if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                    return other
+        return None
+
+    # Returns a fingerprint in the index that is a near duplicate of
+    # [fingerprint], or None.
+    def find(self, fingerprint):
+        with self.lock:
+            return self._find(fingerprint, self._keys(fingerprint))
+
+    # Adds [fingerprint] unless the index already holds a near duplicate.
+    # Returns True if it was added.
+    def add(self, fingerprint):
+        keys = self._keys(fingerprint)
+        with self.lock:
+            if self._find(fingerprint, keys) is not None:
+                return False
+            self._insert(fingerprint, keys)
+            return True
+
+    def _insert(self, fingerprint, keys):
+        for buckets, key in zip(self.buckets, keys):
+            buckets.setdefault(key, list()).append(fingerprint)
+        self.fingerprints.append(fingerprint)
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def save(self, path):
+        with self.lock, open(path, "wb") as file:
+            self.fingerprints.tofile(file)
+
+    # Rebuilds the buckets from fingerprints saved with save(). The
+    # similarity may differ from the one the index was saved with.
+    @classmethod
+    def load(cls, path, similarity=0.95):
+        fingerprints = array("Q")
+        with open(path, "rb") as file:
+            fingerprints.frombytes(file.read())
+        index = cls(similarity)
+        for fingerprint in fingerprints:
+            index._insert(fingerprint, index._keys(fingerprint))
+        return index
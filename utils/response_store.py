@@ -0,0 +1,186 @@
+import os
+import mmap
+import zlib
+import pickle
+import struct
+
+from hashlib import blake2b
+from threading import Lock
+
+from utils import get_urlhash
+from utils.response import Response
+
+
+# Local store of downloaded responses.
+#
+# Responses are appended to segment files of up to segment_size bytes as
+# zlib compressed records, each behind a header of (kind, payload length,
+# key). A page's content is a BLOB record keyed by the blake2b digest of the
+# content, so pages with the same content are stored once. Everything else
+# about a response is a URL record keyed by the urlhash of its url, pointing
+# at the blob by digest. Segments are read through mmap, and the index of
+# both kinds of records is rebuilt by skipping from header to header when
+# the store is opened; a record cut off by a crash is dropped then.
+#
+# download() reads through the store when config.response_cache is set, and
+# replay.py runs the scraper over a stored crawl without any network.
+
+HEADER = struct.Struct("<BI32s")
+BLOB = 1
+URL = 2
+SEGMENT_NAME = "segment-{:05}.dat"
+
+
+def _url_key(url):
+    return bytes.fromhex(get_urlhash(url))
+
+
+class ResponseStore(object):
+    def __init__(self, directory, segment_size=1 << 28, level=6):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.level = level
+        self.lock = Lock()
+        self.urls = dict() # url key -> (segment, offset, length).
+        self.blobs = dict() # content digest -> (segment, offset, length).
+        self.maps = dict() # segment -> mmap of it.
+        os.makedirs(directory, exist_ok=True)
+        segments = sorted(
+            int(name[8:13]) for name in os.listdir(directory)
+            if name.startswith("segment-") and name.endswith(".dat"))
+        for segment in segments:
+            self._scan(segment)
+        self.segment = segments[-1] if segments else 0
+        self.file = open(self._path(self.segment), "ab")
+
+    def _path(self, segment):
+        return os.path.join(self.directory, SEGMENT_NAME.format(segment))
+
+    def _scan(self, segment):
+        with open(self._path(segment), "r+b") as file:
+            size = os.fstat(file.fileno()).st_size
+            offset = 0
+            while offset + HEADER.size <= size:
+                kind, length, key = HEADER.unpack(file.read(HEADER.size))
+                if offset + HEADER.size + length > size:
+                    break
+                index = self.blobs if kind == BLOB else self.urls
+                index[key] = (segment, offset + HEADER.size, length)
+                offset += HEADER.size + length
+                file.seek(offset)
+            if offset < size:
+                # Cut off by a crash while writing.
+                file.truncate(offset)
+
+    def _append(self, kind, key, payload):
+        # Must be called with the lock held.
+        record_size = HEADER.size + len(payload)
+        if self.file.tell() and self.file.tell() + record_size > self.segment_size:
+            self.file.close()
+            self.segment += 1
+            self.file = open(self._path(self.segment), "ab")
+        offset = self.file.tell() + HEADER.size
+        self.file.write(HEADER.pack(kind, len(payload), key))
+        self.file.write(payload)
+        self.file.flush()
+        return self.segment, offset, len(payload)
+
+    def _read(self, location):
+        # Only the copy of the record out of the map holds the lock, so
+        # threads decompress at the same time.
+        segment, offset, length = location
+        with self.lock:
+            view = self.maps.get(segment)
+            if view is None or len(view) < offset + length:
+                # Not mapped yet, or mapped before the record was written.
+                if view is not None:
+                    view.close()
+                with open(self._path(segment), "rb") as file:
+                    view = self.maps[segment] = mmap.mmap(
+                        file.fileno(), 0, access=mmap.ACCESS_READ)
+            payload = view[offset:offset + length]
+        return zlib.decompress(payload)
+
+    def __contains__(self, url):
+        return _url_key(url) in self.urls
+
+    def __len__(self):
+        return len(self.urls)
+
+    def put(self, url, resp):
+        # Stores the Response [resp] of [url], replacing any earlier one.
+        record = {"url": resp.url, "status": resp.status, "error": resp.error,
+                  "digest": None, "response": None}
+        raw_response = resp.raw_response
+        if raw_response is not None:
+            content = raw_response.content
+            digest = blake2b(content, digest_size=32).digest()
+            record["digest"] = digest
+            # Pickled without its content, which is stored as a blob.
+            raw_response._content = b""
+            try:
+                record["response"] = pickle.dumps(raw_response)
+            finally:
+                raw_response._content = content
+        url_payload = zlib.compress(pickle.dumps(record), self.level)
+        blob_payload = None
+        if raw_response is not None and digest not in self.blobs:
+            # Compressed before taking the lock; another thread may store the
+            # same content meanwhile, which the check under the lock catches.
+            blob_payload = zlib.compress(content, self.level)
+        with self.lock:
+            if blob_payload is not None and digest not in self.blobs:
+                self.blobs[digest] = self._append(BLOB, digest, blob_payload)
+            key = _url_key(url)
+            self.urls[key] = self._append(URL, key, url_payload)
+
+    def get(self, url):
+        # Returns the stored Response of [url], or None.
+        location = self.urls.get(_url_key(url))
+        if location is None:
+            return None
+        return self._load(location)
+
+    def _load(self, location):
+        record = pickle.loads(self._read(location))
+        resp = Response({
+            "url": record["url"], "status": record["status"],
+            "error": record["error"]})
+        if record["response"] is not None:
+            raw_response = pickle.loads(record["response"])
+            raw_response._content = self._read(self.blobs[record["digest"]])
+            resp.raw_response = raw_response
+        return resp
+
+    def responses(self):
+        # Generator of the stored (url, Response) pairs, in the order they
+        # were stored.
+        locations = sorted(self.urls.values())
+        for location in locations:
+            resp = self._load(location)
+            yield resp.url, resp
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+            for view in self.maps.values():
+                view.close()
+            self.maps.clear()
+
+
+_stores = dict()
+_stores_lock = Lock()
+
+
+# Returns the ResponseStore of config.response_cache, shared by all threads,
+# or None if there is none.
+def open_response_store(config):
+    if not config.response_cache:
+        return None
+    with _stores_lock:
+        store = _stores.get(config.response_cache)
+        if store is None:
+            store = _stores[config.response_cache] = ResponseStore(
+                config.response_cache, config.segment_size,
+                config.compress_level)
+        return store
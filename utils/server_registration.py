@@ -1,8 +1,13 @@
 import os
-from spacetime import Node
-from utils.pcc_models import Register
+import json
+import time
+
+# spacetime is only imported when registering, see get_cache_server: it is
+# the slowest import of the crawler, and not needed at all with CACHESERVER
+# set or a cached registration.
 
 def init(df, user_agent, fresh):
+    from utils.pcc_models import Register
     reg = df.read_one(Register, user_agent)
     if not reg:
         reg = Register(user_agent, fresh)
@@ -19,8 +24,33 @@ def init(df, user_agent, fresh):
             df.push()
     return reg.load_balancer
 
-def get_cache_server(config, restart):
+def _register(config, restart):
+    from spacetime import Node
+    from utils.pcc_models import Register
     init_node = Node(
         init, Types=[Register], dataframe=(config.host, config.port))
     return init_node.start(
-        config.user_agent, restart or not os.path.exists(config.save_file))
\ No newline at end of file
+        config.user_agent, restart or not os.path.exists(config.save_file))
+
+def get_cache_server(config, restart):
+    # Registers with the dataframe server at HOST:PORT and returns the
+    # address of the load balancer it assigns. When resuming, an address
+    # registered less than REGISTRATIONTTL seconds ago for the same user
+    # agent and server is used again without registering.
+    path = f"{config.save_file}.cache_server"
+    key = [config.user_agent, config.host, config.port]
+    if config.registration_ttl > 0 and not restart and os.path.exists(path):
+        try:
+            with open(path) as file:
+                cached = json.load(file)
+            if (cached["key"] == key
+                    and time.time() - cached["time"] < config.registration_ttl):
+                return tuple(cached["address"])
+        except (OSError, ValueError, KeyError):
+            pass
+    address = _register(config, restart)
+    if config.registration_ttl > 0:
+        with open(path, "w") as file:
+            json.dump({"key": key, "time": time.time(),
+                       "address": list(address)}, file)
+    return address
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+
+from collections import Counter
+from threading import Lock, local
+
+
+# Crawl statistics, sharded per thread.
+#
+# Every thread that records statistics gets its own StatsShard, so recording
+# never takes a lock and never races with another thread. merged() combines
+# the shards on demand, and save() writes the merged state to a snapshot file,
+# which scraper.checkpoint does every few seconds so a crash does not lose the
+# report.
+#
+# Word frequencies are kept in a TopK summary, so memory is bounded by its
+# capacity instead of by the vocabulary of the crawl.
+
+
+class TopK(object):
+    # Space-Saving style summary of the most frequent items. Holds at most
+    # 2 * capacity counts; when full it keeps the capacity largest and
+    # remembers the largest count it dropped as floor. An item that is not
+    # tracked starts from floor, so each count overestimates the true count
+    # by at most floor, and any item more frequent than floor is tracked.
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.counts = dict()
+        self.floor = 0
+
+    def update(self, counts):
+        tracked = self.counts
+        for item, count in counts.items():
+            if item in tracked:
+                tracked[item] += count
+            else:
+                tracked[item] = self.floor + count
+        if len(tracked) > 2 * self.capacity:
+            self._prune()
+
+    def _prune(self):
+        ranked = sorted(self.counts.items(), key=lambda x: x[1], reverse=True)
+        self.floor = max(self.floor, ranked[self.capacity][1])
+        self.counts = dict(ranked[:self.capacity])
+
+    def merge(self, other):
+        # Combines two summaries; errors of both add up.
+        merged = TopK(self.capacity)
+        merged.counts = Counter(self.counts)
+        merged.counts.update(other.counts)
+        merged.counts = dict(merged.counts)
+        merged.floor = self.floor + other.floor
+        if len(merged.counts) > merged.capacity:
+            merged._prune()
+        return merged
+
+    def most_common(self, k):
+        return Counter(self.counts).most_common(k)
+
+
+class StatsShard(object):
+    # Only ever written by the thread that owns it.
+    def __init__(self, capacity):
+        self.words = TopK(capacity)
+        self.ics_sites = Counter()
+        self.pages = 0
+        self.longest_page_url = ''
+        self.highest_word_count = -1
+
+
+class CrawlStats(object):
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.shards = list()
+        self.shards_lock = Lock() # Only taken when a thread makes its shard.
+        self.local = local()
+
+    def shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = StatsShard(self.capacity)
+            with self.shards_lock:
+                self.shards.append(shard)
+            return shard
+
+    # Records a downloaded page and its word counts, stop words excluded.
+    # Returns True if it is the longest page seen so far.
+    def add_page(self, url, word_count, word_counts):
+        shard = self.shard()
+        shard.pages += 1
+        shard.words.update(word_counts)
+        if word_count > shard.highest_word_count:
+            longest = word_count > self.longest()[1]
+            shard.longest_page_url = url
+            shard.highest_word_count = word_count
+            return longest
+        return False
+
+    def add_ics_site(self, domain):
+        self.shard().ics_sites[domain] += 1
+
+    def longest(self):
+        # Returns (url, word count) of the longest page over all shards.
+        with self.shards_lock:
+            shards = list(self.shards)
+        url, count = '', -1
+        for shard in shards:
+            if shard.highest_word_count > count:
+                url, count = shard.longest_page_url, shard.highest_word_count
+        return url, count
+
+    def merged(self, snapshots=()):
+        # Combines all shards into one, and the given snapshots of other
+        # crawls with them. Shards may be written while this runs; copying a
+        # dict is atomic, so the result is consistent per shard but may miss
+        # the page a thread is recording right now.
+        with self.shards_lock:
+            shards = list(self.shards)
+        shards.extend(_shard_from_snapshot(snapshot, self.capacity)
+                      for snapshot in snapshots)
+        merged = StatsShard(self.capacity)
+        for shard in shards:
+            words = TopK(shard.words.capacity)
+            words.counts = shard.words.counts.copy()
+            words.floor = shard.words.floor
+            merged.words = merged.words.merge(words)
+            merged.ics_sites.update(shard.ics_sites.copy())
+            merged.pages += shard.pages
+            if shard.highest_word_count > merged.highest_word_count:
+                merged.longest_page_url = shard.longest_page_url
+                merged.highest_word_count = shard.highest_word_count
+        return merged
+
+    def snapshot(self):
+        # The merged state as a dict that can be written as JSON.
+        merged = self.merged()
+        return {
+            "time": time.time(),
+            "pages": merged.pages,
+            "longest_page_url": merged.longest_page_url,
+            "highest_word_count": merged.highest_word_count,
+            "ics_sites": merged.ics_sites,
+            "words": merged.words.counts,
+            "words_floor": merged.words.floor,
+        }
+
+    def save(self, path):
+        # Written to a temporary file first, so a crash mid-write keeps the
+        # previous snapshot.
+        snapshot = self.snapshot()
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(snapshot, file)
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, path):
+        # Restores a snapshot into the shard of the calling thread.
+        with open(path) as file:
+            snapshot = json.load(file)
+        shard = self.shard()
+        shard.pages += snapshot["pages"]
+        shard.longest_page_url = snapshot["longest_page_url"]
+        shard.highest_word_count = snapshot["highest_word_count"]
+        shard.ics_sites.update(snapshot["ics_sites"])
+        shard.words.counts = snapshot["words"]
+        shard.words.floor = snapshot["words_floor"]
+
+
+def _shard_from_snapshot(snapshot, capacity):
+    shard = StatsShard(capacity)
+    shard.pages = snapshot["pages"]
+    shard.longest_page_url = snapshot["longest_page_url"]
+    shard.highest_word_count = snapshot["highest_word_count"]
+    shard.ics_sites.update(snapshot["ics_sites"])
+    shard.words.counts = dict(snapshot["words"])
+    shard.words.floor = snapshot["words_floor"]
+    return shard
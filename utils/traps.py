@@ -0,0 +1,135 @@
+import re
+import pickle
+
+from array import array
+from collections import Counter
+from hashlib import blake2b
+from threading import Lock
+from urllib.parse import urlsplit, parse_qsl
+
+
+# Crawler trap detection with crawl budgets.
+#
+# Calendars, paginated archives and session-id loops produce an endless
+# number of distinct urls that all look alike. TrapDetector maps every url to
+# a path template, its host, path and query with numbers and ids replaced by
+# placeholders, and admits at most
+# template_budget urls per template and host_budget urls per host. Hosts are
+# few and counted exactly; templates are counted in a count-min sketch, so
+# memory stays fixed however many templates a trap generates. The sketch only
+# ever overestimates, so a template may be cut off slightly early but never
+# late.
+
+# Reasons check() gives for rejecting a url.
+REPEATING_PATH = "repeating path"
+HOST_BUDGET = "host budget"
+TEMPLATE_BUDGET = "template budget"
+
+DIGITS = re.compile(r"\d+")
+ID_SEGMENT = re.compile(r"^[0-9a-fA-F-]{16,}$")
+
+
+def _template_part(part):
+    return "<id>" if ID_SEGMENT.match(part) else DIGITS.sub("0", part)
+
+
+# Returns the path template of [url], e.g.
+# www.ics.uci.edu/events/0-0-0?date=today&page=0 for
+# https://www.ics.uci.edu/events/2019-05-04?date=today&page=3. Query values
+# are kept apart from their numbers and ids like path segments, so
+# doku.php?id=start and doku.php?id=projects are two templates.
+def path_template(url):
+    parts = urlsplit(url)
+    segments = [_template_part(segment) for segment in parts.path.split("/")]
+    pairs = sorted(set(
+        f"{key}={_template_part(value)}"
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)))
+    return f"{parts.hostname}{'/'.join(segments)}?{'&'.join(pairs)}"
+
+
+class CountMinSketch(object):
+    # depth rows of width counters. A key is counted in one counter per row,
+    # and its count is the smallest of those counters.
+    def __init__(self, width=1 << 16, depth=4):
+        self.width = width
+        self.depth = depth
+        self.counters = array("I", bytes(4 * width * depth))
+
+    def _indexes(self, key):
+        digest = blake2b(key.encode("utf-8"), digest_size=8 * self.depth).digest()
+        return [
+            row * self.width
+            + int.from_bytes(digest[8 * row:8 * row + 8], "little") % self.width
+            for row in range(self.depth)]
+
+    def count(self, key):
+        counters = self.counters
+        return min(counters[index] for index in self._indexes(key))
+
+    # Adds one to the count of [key] and returns the new count. Only the
+    # counters at the current minimum are raised (conservative update), which
+    # keeps overestimates from collisions lower.
+    def add(self, key):
+        counters = self.counters
+        indexes = self._indexes(key)
+        count = min(counters[index] for index in indexes) + 1
+        for index in indexes:
+            if counters[index] < count:
+                counters[index] = count
+        return count
+
+
+class TrapDetector(object):
+    def __init__(self, host_budget=20000, template_budget=500, max_repeats=2,
+                 sketch_width=1 << 16, sketch_depth=4):
+        # Budgets of 0 are unlimited.
+        self.host_budget = host_budget
+        self.template_budget = template_budget
+        self.max_repeats = max_repeats
+        self.hosts = Counter()
+        self.templates = CountMinSketch(sketch_width, sketch_depth)
+        self.lock = Lock()
+
+    # Returns None if [url] does not look like a trap. Does not count it.
+    def check_path(self, url):
+        segments = Counter(segment for segment in urlsplit(url).path.split("/") if segment)
+        if segments and max(segments.values()) > self.max_repeats:
+            return REPEATING_PATH
+        return None
+
+    # Returns None and counts [url] against its budgets if it may be crawled,
+    # otherwise the reason why not. Rejected urls are not counted.
+    def admit(self, url):
+        reason = self.check_path(url)
+        if reason is not None:
+            return reason
+        host = urlsplit(url).hostname
+        template = path_template(url)
+        with self.lock:
+            if self.host_budget and self.hosts[host] >= self.host_budget:
+                return HOST_BUDGET
+            if self.template_budget and self.templates.count(template) >= self.template_budget:
+                return TEMPLATE_BUDGET
+            self.hosts[host] += 1
+            self.templates.add(template)
+        return None
+
+    def save(self, path):
+        with self.lock, open(path, "wb") as file:
+            pickle.dump({
+                "hosts": dict(self.hosts),
+                "width": self.templates.width,
+                "depth": self.templates.depth,
+                "templates": self.templates.counters.tobytes(),
+            }, file)
+
+    # Restores the counts saved with save(). The budgets are the ones this
+    # detector was made with.
+    def load(self, path):
+        with open(path, "rb") as file:
+            state = pickle.load(file)
+        with self.lock:
+            self.hosts = Counter(state["hosts"])
+            self.templates = CountMinSketch(state["width"], state["depth"])
+            self.templates.counters = array("I")
+            self.templates.counters.frombytes(state["templates"])
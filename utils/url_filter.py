@@ -0,0 +1,118 @@
+import re
+
+from urllib.parse import urlsplit
+
+
+# Static rules deciding which urls the crawler may download.
+#
+# UrlFilter checks a url in one pass over its parts: the scheme against a set,
+# the hostname against a trie of allowed domain suffixes, the last path
+# segment's extension against a set, and the whole url against a single
+# compiled blacklist alternation. Nothing is compiled or allocated per call.
+
+ALLOWED_SCHEMES = frozenset(["http", "https"])
+
+# (domain, path prefix) pairs. A domain also allows all of its subdomains.
+ALLOWED_DOMAINS = (
+    ("ics.uci.edu", None),
+    ("cs.uci.edu", None),
+    ("informatics.uci.edu", None),
+    ("stat.uci.edu", None),
+    ("today.uci.edu", "/department/information_computer_sciences"),
+)
+
+BLACKLIST_PATTERN = re.compile(
+    r"login|intranet|tippersweb|wics-meeting-dbh|wics.ics.uci.edu/events/|action=download|" +
+    r"share=facebook|share=twitter|pdf|\.java|\.py|\.scm|\.r|\.m|\.bib|\.pptx|\.ppsx|ical=1"
+)
+
+BLOCKED_EXTENSIONS = frozenset([
+    "css", "js", "bmp", "gif", "jpeg", "jpg", "ico",
+    "png", "tif", "tiff", "mid", "mp2", "mp3", "mp4",
+    "wav", "avi", "mov", "mpeg", "ram", "m4v", "mkv", "ogg", "ogv", "pdf",
+    "ps", "eps", "tex", "ppt", "pptx", "doc", "docx", "xls", "xlsx", "names",
+    "data", "dat", "exe", "bz2", "tar", "msi", "bin", "7z", "psd", "dmg", "iso",
+    "epub", "dll", "cnf", "tgz", "sha1",
+    "thmx", "mso", "arff", "rtf", "jar", "csv",
+    "rm", "smil", "wmv", "swf", "wma", "zip", "rar", "gz",
+])
+
+# Reasons check() gives for rejecting a url.
+INVALID = "invalid"
+SCHEME = "scheme"
+DOMAIN = "domain"
+EXTENSION = "extension"
+BLACKLIST = "blacklist"
+
+_PATHS = object() # Key of the allowed path prefixes in a trie node.
+
+
+class HostSuffixTrie(object):
+    # Trie over the labels of hostnames, last label first, so a hostname is
+    # matched against every allowed suffix in one walk.
+    def __init__(self, domains=()):
+        self.root = dict()
+        for domain, path_prefix in domains:
+            self.add(domain, path_prefix)
+
+    def add(self, domain, path_prefix=None):
+        node = self.root
+        for label in reversed(domain.lower().split(".")):
+            node = node.setdefault(label, dict())
+        node.setdefault(_PATHS, list()).append(path_prefix)
+
+    def match(self, hostname, path):
+        node = self.root
+        for label in reversed(hostname.split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            for path_prefix in node.get(_PATHS, ()):
+                if path_prefix is None or path.startswith(path_prefix):
+                    return True
+        return False
+
+
+class UrlFilter(object):
+    def __init__(self, domains=ALLOWED_DOMAINS, blacklist=BLACKLIST_PATTERN,
+                 extensions=BLOCKED_EXTENSIONS, schemes=ALLOWED_SCHEMES):
+        self.hosts = HostSuffixTrie(domains)
+        self.blacklist = blacklist
+        self.extensions = extensions
+        self.schemes = schemes
+
+    # Returns None if [url] may be downloaded, otherwise the reason why not.
+    def check(self, url):
+        if not url:
+            return INVALID
+        try:
+            parts = urlsplit(url)
+            hostname = parts.hostname
+        except ValueError:
+            return INVALID
+        if parts.scheme not in self.schemes:
+            return SCHEME
+        if hostname is None or not self.hosts.match(hostname, parts.path):
+            return DOMAIN
+        if self.blacklist.search(url) is not None:
+            return BLACKLIST
+        # Extension of the last path segment, without its ;parameters.
+        path = parts.path
+        segment = path[path.rfind("/") + 1:].split(";", 1)[0]
+        dot = segment.rfind(".")
+        if dot != -1 and segment[dot + 1:].lower() in self.extensions:
+            return EXTENSION
+        return None
+
+    # Returns the urls of [urls] that may be downloaded, in order. Calls
+    # on_reject(url, reason) for every other url, if given.
+    def filter(self, urls, on_reject=None):
+        check = self.check
+        allowed = list()
+        for url in urls:
+            reason = check(url)
+            if reason is None:
+                allowed.append(url)
+            elif on_reject is not None:
+                on_reject(url, reason)
+        return allowed